@@ -0,0 +1,5 @@
+"""
+Title: DataViz helpers
+Author: Keaton Turner
+Description: Shared helpers used by the visualization scripts in this repo.
+"""
@@ -0,0 +1,3 @@
+from dataviz.cli import main
+
+main()
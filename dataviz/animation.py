@@ -0,0 +1,401 @@
+"""
+Title: Precipitation/snow animation frames
+Author: Keaton Turner
+Description: Draws the daily four-panel cumulative precipitation and snowfall
+figure for the final project, renders the frames across a process pool and
+writes them to PNGs or straight into a GIF/APNG/MP4. Frames are cached by
+content, so only days whose data changed are drawn again.
+"""
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+import shapely
+from PIL import Image
+
+from dataviz import loaders, profiling
+from dataviz.geometry import label_points, load_geometry
+from dataviz.rendercache import FrameCache, code_key, content_key, is_current, record, record_all
+
+PRCP_COL = "YTD-PRCP-NORMAL"
+SNOW_COL = "YTD-SNOW-NORMAL"
+FRAME_DPI = 150
+
+# per-process state, filled in by _init_worker
+_worker = {}
+
+
+def frame_name(i, day):
+    return "{}_precip_{}.png".format(str(i).zfill(3), day)
+
+
+def frame_days(days, cube, metrics):
+    """(index, day) of every frame that has both precipitation and snow data."""
+    prcp = np.isnan(cube[:, :, metrics.index(PRCP_COL)]).all(axis=1)
+    snow = np.isnan(cube[:, :, metrics.index(SNOW_COL)]).all(axis=1)
+    return [(i, day) for i, day in enumerate(days) if not (prcp[i] or snow[i])]
+
+
+def draw_panels(ax_map, ax_bar, merged, use_col, title, cmap, station_counties, bar_color=None):
+    """Choropleth of `use_col` with the top 10 counties numbered, plus their bar chart."""
+    # generate the map
+    merged.plot(column = use_col, cmap = cmap, linewidth = 0.8, ax = ax_map, edgecolor = 'grey')
+    ax_map.set_title(title, fontdict={'fontsize': '11', 'fontweight' : '3'})
+    ax_map.axis("off")
+
+    # Show top 10 locations (label anchors come precomputed with the geometry)
+    if 'coords' not in merged:
+        merged = merged.assign(coords=list(map(tuple, label_points(merged))))
+    top10 = merged.sort_values(by=use_col, ascending=False).head(10)
+    c = 0
+    for idx, row in top10.iterrows():
+        c += 1
+        if row["COUNTY"] in station_counties:
+            ax_map.annotate(str(c), xy=row['coords'], horizontalalignment='center', size=(9))
+
+    # Generate bar plot w/ top 10 counties
+    ax_bar.bar(top10["COUNTY"], top10[use_col], color=bar_color)
+    ax_bar.tick_params(rotation=90)
+    ax_bar.spines['right'].set_visible(False)
+    ax_bar.spines['top'].set_visible(False)
+    ax_bar.tick_params(axis='y', labelsize= 8)
+    t = [0, round(top10[use_col].max(),1)]
+    ax_bar.set_yticks(t)
+    ax_bar.set_yticklabels(t, rotation=0)
+
+
+def draw_frame(map_df, day, prcp, snow, station_counties):
+    """Four-panel figure for one day; `prcp`/`snow` are aligned to `map_df` rows."""
+    fig, [[ax, ax2], [ax3, ax4]] = plt.subplots(2,2, gridspec_kw={'width_ratios': [12, 12], 'height_ratios':[10,8]}, dpi=FRAME_DPI)
+    fig.suptitle('Cumulative Totals: {}'.format(day), size = 15, y=.999)
+
+    draw_panels(ax, ax3, map_df.assign(**{PRCP_COL: prcp}), PRCP_COL,
+                "Precipitation (inches)", 'Blues', station_counties)
+    draw_panels(ax2, ax4, map_df.assign(**{SNOW_COL: snow}), SNOW_COL,
+                "Snowfall (inches)", 'Greens', station_counties, bar_color="green")
+
+    fig.tight_layout(rect=[0.05, 0.03, .9, 0.9])
+    return fig
+
+
+class PanelTemplate:
+    """One map + bar chart pair whose artists are reused from frame to frame."""
+
+    def __init__(self, ax_map, ax_bar, map_df, use_col, title, cmap, station_counties,
+                 label_points, bar_color=None, top=10):
+        self.ax_map = ax_map
+        self.ax_bar = ax_bar
+        self.counties = map_df["COUNTY"].to_numpy()
+        self.annotated = np.isin(self.counties, list(station_counties))
+        self.label_points = label_points
+        self.top = top
+
+        # draw the county polygons once, later frames only recolor them
+        map_df.assign(**{use_col: 0.0}).plot(column = use_col, cmap = cmap, linewidth = 0.8,
+                                              ax = ax_map, edgecolor = 'grey')
+        self.collection = ax_map.collections[-1]
+        if len(self.collection.get_paths()) == len(map_df):
+            self.patch_rows = np.arange(len(map_df))
+        else:
+            # older geopandas draws one patch per part of a multipolygon
+            parts = shapely.get_num_geometries(map_df.geometry.values)
+            self.patch_rows = np.repeat(np.arange(len(map_df)), parts)
+        ax_map.set_title(title, fontdict={'fontsize': '11', 'fontweight' : '3'})
+        ax_map.axis("off")
+        self.labels = [ax_map.annotate("", xy=(0, 0), horizontalalignment='center', size=(9))
+                       for _ in range(top)]
+
+        self.bars = ax_bar.bar(np.arange(top), np.zeros(top), color=bar_color)
+        ax_bar.set_xticks(np.arange(top))
+        ax_bar.tick_params(rotation=90)
+        ax_bar.spines['right'].set_visible(False)
+        ax_bar.spines['top'].set_visible(False)
+        ax_bar.tick_params(axis='y', labelsize= 8)
+        # lay out for the longest names so the axes don't need resizing per frame
+        longest = sorted(self.counties, key=len, reverse=True)[:top]
+        ax_bar.set_xticklabels(longest)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.collection.set_array(np.ma.masked_invalid(values[self.patch_rows]))
+        self.collection.set_clim(np.nanmin(values), np.nanmax(values))
+
+        # NaN sorts last, same as sort_values(ascending=False)
+        order = np.argsort(-values, kind="stable")[:self.top]
+        heights = values[order]
+        for c, (label, row) in enumerate(zip(self.labels, order)):
+            label.set_text(str(c + 1))
+            label.xy = label.xyann = tuple(self.label_points[row])
+            label.set_visible(bool(self.annotated[row]))
+        for c, bar in enumerate(self.bars):
+            bar.set_height(heights[c] if c < len(heights) and not np.isnan(heights[c]) else 0)
+        self.ax_bar.set_xticklabels(list(self.counties[order]) + [""] * (self.top - len(order)))
+        t = [0, round(np.nanmax(heights), 1)]
+        self.ax_bar.set_ylim(0, np.nanmax(heights) * 1.05)
+        self.ax_bar.set_yticks(t)
+        self.ax_bar.set_yticklabels(t, rotation=0)
+
+
+class FrameTemplate:
+    """The four-panel figure built once; each frame only swaps in new data."""
+
+    def __init__(self, map_df, station_counties):
+        self.fig, [[ax, ax2], [ax3, ax4]] = plt.subplots(2,2, gridspec_kw={'width_ratios': [12, 12], 'height_ratios':[10,8]}, dpi=FRAME_DPI)
+        self.title = self.fig.suptitle('Cumulative Totals:', size = 15, y=.999)
+        if "LABEL_X" in map_df:
+            anchors = map_df[["LABEL_X", "LABEL_Y"]].to_numpy()
+        else:
+            anchors = label_points(map_df)
+        self.prcp = PanelTemplate(ax, ax3, map_df, PRCP_COL, "Precipitation (inches)", 'Blues',
+                                  station_counties, anchors)
+        self.snow = PanelTemplate(ax2, ax4, map_df, SNOW_COL, "Snowfall (inches)", 'Greens',
+                                  station_counties, anchors, bar_color="green")
+        self.fig.tight_layout(rect=[0.05, 0.03, .9, 0.9])
+
+    def draw(self, day, prcp, snow):
+        self.title.set_text('Cumulative Totals: {}'.format(day))
+        self.prcp.update(prcp)
+        self.snow.update(snow)
+        return self.fig
+
+
+def _init_worker(map_file, station_counties, reuse_figure=False, tolerance=None):
+    # each worker loads the county geometries once and draws off-screen; in
+    # this process (processes=1) the caller's backend is left alone
+    if multiprocessing.parent_process() is not None:
+        profiling.detach()
+        plt.switch_backend("Agg")
+    _worker["map_df"] = load_geometry(map_file, tolerance=tolerance)
+    _worker["station_counties"] = set(station_counties)
+    _worker["template"] = None
+    if reuse_figure:
+        _worker["template"] = FrameTemplate(_worker["map_df"], _worker["station_counties"])
+
+
+def settings_key(map_file, station_counties, tolerance=None, reuse_figure=False):
+    """Key of everything every frame shares: the shapes, the options and the
+    drawing code. `FrameTemplate` and `draw_frame` lay frames out differently,
+    so which one draws is part of it."""
+    return content_key(loaders._source_state([map_file]), tolerance, set(station_counties),
+                       reuse_figure, FRAME_DPI, code_key(draw_frame), code_key(FrameTemplate))
+
+
+def frame_keys(days, cube, metrics, map_file, station_counties, tolerance=None, reuse_figure=False):
+    """Content key of every frame in `frame_days`, as a dict of index -> key.
+
+    A key covers the frame's slice of the cube plus the `settings_key`, so
+    appending a day leaves the other frames' keys alone.
+    """
+    p, s = metrics.index(PRCP_COL), metrics.index(SNOW_COL)
+    shared = settings_key(map_file, station_counties, tolerance, reuse_figure)
+    # float32 drops last-bit noise from the groupby means, far below what the colors show
+    values = cube[:, :, [p, s]].astype(np.float32)
+    return {i: content_key(shared, day, values[i]) for i, day in frame_days(days, cube, metrics)}
+
+
+def _render_one(task):
+    i, day, prcp, snow, path, keep_buffer = task
+    start = time.perf_counter()
+    template = _worker["template"]
+    if template is not None:
+        fig = template.draw(day, prcp, snow)
+    else:
+        fig = draw_frame(_worker["map_df"], day, prcp, snow, _worker["station_counties"])
+    drawn = time.perf_counter()
+
+    # draw once and reuse the Agg buffer for both the PNG and the animation
+    if not hasattr(fig.canvas, "buffer_rgba"):  # caller's backend isn't Agg based
+        FigureCanvasAgg(fig)
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    rasterized = time.perf_counter()
+    if path is not None:
+        # write then rename so an interrupted run never leaves half a frame
+        tmp_file = "{}.{}.tmp".format(path, os.getpid())
+        Image.fromarray(rgba).save(tmp_file, format="PNG")
+        os.replace(tmp_file, path)
+    rgba = rgba.copy() if keep_buffer else None
+    if template is None:
+        plt.close(fig)
+    end = time.perf_counter()
+    # per-frame breakdown for dataviz.profiling (workers can't see the profiler)
+    phases = {"draw": drawn - start, "canvas": rasterized - drawn, "png": end - rasterized}
+    return i, day, path, end - start, rgba, phases
+
+
+def _frame_tasks(days, cube, metrics, paths, keep_buffer):
+    """Render tasks for the frames in `paths` (index -> output PNG or None)."""
+    p, s = metrics.index(PRCP_COL), metrics.index(SNOW_COL)
+    return [(i, day, cube[i, :, p], cube[i, :, s], paths[i], keep_buffer)
+            for i, day in frame_days(days, cube, metrics) if i in paths]
+
+
+def _iter_rendered(tasks, map_file, station_counties, processes, reuse_figure, tolerance, verbose):
+    """Yield rendered frames in day order, timing each one."""
+    station_counties = list(station_counties)
+    initargs = (map_file, station_counties, reuse_figure, tolerance)
+    if processes == 1:
+        _init_worker(*initargs)
+        try:
+            yield from _report(map(_render_one, tasks), verbose)
+        finally:
+            if _worker["template"] is not None:
+                plt.close(_worker["template"].fig)
+                _worker["template"] = None
+        return
+
+    # fork where we can so the calling script isn't re-imported in every worker
+    context = None
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=_init_worker, initargs=initargs) as pool:
+        yield from _report(pool.map(_render_one, tasks), verbose)
+
+
+def _report(results, verbose):
+    for i, day, path, seconds, rgba, phases in results:
+        if verbose:
+            print("frame {} ({}) rendered in {:.2f}s".format(str(i).zfill(3), day, seconds))
+        profiling.frame(index=i, day=day, seconds=round(seconds, 4),
+                        **{k: round(v, 4) for k, v in phases.items()})
+        yield i, day, path, seconds, rgba
+
+
+def render_frames(days, cube, metrics, map_file, out_dir, station_counties, processes=None,
+                  reuse_figure=False, tolerance=None, verbose=True, cache=True):
+    """Render the frames of the animation to `out_dir`, spread over a process pool.
+
+    `cube` comes from `daily_county_cube` and must be aligned to the rows of
+    `map_file`. `processes=None` uses every core, `processes=1` renders in
+    this process. With `reuse_figure` each worker builds a `FrameTemplate`
+    once and only updates colors, bars and labels per frame. `tolerance`
+    draws simplified county outlines (see `dataviz.geometry.simplify`).
+    With `cache` frames already in `out_dir` for the same data are skipped.
+    Returns a list of (index, day, path, seconds) per rendered frame.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    keys = frame_keys(days, cube, metrics, map_file, station_counties, tolerance, reuse_figure)
+    paths = {i: os.path.join(out_dir, frame_name(i, days[i])) for i in keys}
+    if cache:
+        paths = {i: path for i, path in paths.items() if not is_current(path, keys[i])}
+
+    tasks = _frame_tasks(days, cube, metrics, paths, False)
+    results = _iter_rendered(tasks, map_file, station_counties, processes, reuse_figure,
+                             tolerance, verbose)
+    timings = [(i, day, path, seconds) for i, day, path, seconds, _ in results]
+    record_all({path: keys[i] for i, _, path, _ in timings})
+    return timings
+
+
+def render_animation(days, cube, metrics, map_file, out_file, station_counties, fps=10,
+                     frame_dir=None, processes=None, reuse_figure=True, tolerance=None, verbose=True,
+                     cache=True):
+    """Render the animation straight to `out_file` (.gif, .png/.apng or .mp4).
+
+    Frame buffers go from the workers to the writer in memory. With `cache`
+    each frame is also kept in a `FrameCache` and only frames whose data
+    changed are drawn, the rest are read back; when nothing changed the
+    animation isn't rewritten at all. `frame_dir` also keeps the PNGs under
+    their `frame_name`. Other arguments are the same as `render_frames`,
+    which this returns the timings of (rendered frames only).
+    """
+    keys = frame_keys(days, cube, metrics, map_file, station_counties, tolerance, reuse_figure)
+    animation_key = content_key(list(keys.values()), fps, os.path.splitext(out_file)[1].lower())
+    named = {i: os.path.join(frame_dir, frame_name(i, days[i])) for i in keys} if frame_dir else {}
+    if frame_dir is not None:
+        os.makedirs(frame_dir, exist_ok=True)
+    if cache and is_current(out_file, animation_key) and all(
+            is_current(path, keys[i]) for i, path in named.items()):
+        profiling.count("animations_unchanged")
+        return []
+
+    # one cache folder per settings, folders for settings not used lately are pruned
+    frame_cache = FrameCache(settings_key(map_file, station_counties, tolerance, reuse_figure)) if cache else None
+    if cache:
+        paths = {i: frame_cache.path(key) for i, key in keys.items() if not os.path.exists(frame_cache.path(key))}
+    else:
+        paths = {i: named.get(i) for i in keys}
+    timings = []
+
+    def frames():
+        tasks = _frame_tasks(days, cube, metrics, paths, True)
+        rendered = _iter_rendered(tasks, map_file, station_counties, processes, reuse_figure,
+                                  tolerance, verbose)
+        for i, key in keys.items():
+            if i in paths:
+                _, day, path, seconds, rgba = next(rendered)
+                timings.append((i, day, path, seconds))
+            else:
+                start = time.perf_counter()
+                rgba = frame_cache.load(key)
+                profiling.frame(index=i, day=days[i], seconds=round(time.perf_counter() - start, 4),
+                                cached=True)
+            if cache and frame_dir is not None:
+                shutil.copyfile(frame_cache.path(key), named[i])
+            # time spent in the writer between frames
+            with profiling.stage("encode"):
+                yield rgba
+
+    with profiling.stage("animation"):
+        write_animation(frames(), out_file, fps=fps)
+    if cache:
+        record_all({path: keys[i] for i, path in named.items()})
+        record(out_file, animation_key)
+    return timings
+
+
+def write_animation(frames, out_file, fps=10):
+    """Stream an iterable of RGBA arrays (all the same size) into an animation file.
+
+    GIF and APNG are written with Pillow, MP4 is piped to ffmpeg as raw video.
+    """
+    ext = os.path.splitext(out_file)[1].lower()
+    if ext in (".gif", ".png", ".apng"):
+        _write_pillow(frames, out_file, fps, "GIF" if ext == ".gif" else "PNG")
+    elif ext in (".mp4", ".m4v", ".mov"):
+        _write_ffmpeg(frames, out_file, fps)
+    else:
+        raise ValueError("Unsupported animation format: {}".format(ext))
+
+
+def _write_pillow(frames, out_file, fps, fmt):
+    frames = iter(frames)
+    mode = "RGB" if fmt == "GIF" else "RGBA"
+    first = Image.fromarray(next(frames)).convert(mode)
+    # Pillow pulls the remaining GIF frames from the generator one at a time;
+    # the APNG writer walks the frames twice (and keeps them all anyway)
+    rest = (Image.fromarray(rgba).convert(mode) for rgba in frames)
+    if fmt == "PNG":
+        rest = list(rest)
+    first.save(out_file, format=fmt, save_all=True, append_images=rest,
+               duration=int(1000 / fps), loop=0)
+
+
+def _write_ffmpeg(frames, out_file, fps):
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape[:2]
+    cmd = [mpl.rcParams["animation.ffmpeg_path"], "-y", "-loglevel", "error",
+           "-f", "rawvideo", "-pix_fmt", "rgba", "-s", "{}x{}".format(width, height),
+           "-r", str(fps), "-i", "-",
+           "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-vcodec", "libx264", "-pix_fmt", "yuv420p",
+           out_file]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    try:
+        proc.stdin.write(first.tobytes())
+        for rgba in frames:
+            proc.stdin.write(rgba.tobytes())
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise RuntimeError("ffmpeg exited with status {}".format(proc.returncode))
@@ -0,0 +1,366 @@
+"""
+Title: Chart pipeline benchmarks
+Author: Keaton Turner
+Description: Generates synthetic inputs of a configurable size shaped like
+the real data (wholesale customers, France department files, NOAA daily
+normals for N stations over the bundled Colorado counties) and times the
+load, aggregate and render phases of every chart separately. Results are
+written as JSON so runs can be compared across releases.
+
+    python -m dataviz.bench --customers 1000000 --stations 500 --out bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLORADO_SHAPEFILE = os.path.join(HERE, "..", "FinalProj", "Colorado_County_Boundaries.shp")
+FRANCE_SHAPEFILE = os.path.join(HERE, "..", "week7_advanced_matplotlib", "fra.shp")
+
+# a leap year so Feb 29 is in there, written the way the NOAA export has it
+YEAR_DAYS = pd.date_range("2020-01-01", "2020-12-31")
+
+
+def synthetic_customers(n, seed=0):
+    """`n` rows shaped like wholesale_customers_data.csv."""
+    rng = np.random.default_rng(seed)
+    from dataviz.wholesale import SPENDING_COLS
+    df = pd.DataFrame({
+        "channel": rng.choice([1, 2], size=n, p=[0.68, 0.32]),
+        "region": rng.choice([1, 2, 3], size=n, p=[0.18, 0.1, 0.72]),
+    })
+    scales = [12000, 5800, 7900, 3000, 2900, 1500]
+    for col, scale in zip(SPENDING_COLS, scales):
+        df[col] = rng.lognormal(np.log(scale), 1.0, size=n).astype("int64")
+    return df
+
+
+def synthetic_france(departments, seed=0):
+    """Department totals and recent-trend frames shaped like the NYT CSVs,
+    including the duplicate per_100k columns, '<1' values and empty columns."""
+    rng = np.random.default_rng(seed)
+    n = len(departments)
+    totals = pd.DataFrame({
+        "Department": departments,
+        "total_hospitalizations": rng.integers(500, 20000, n).astype(float),
+        "per_100k": rng.integers(200, 1500, n).astype(float),
+        "total_deaths": rng.integers(50, 4000, n).astype(float),
+        "per_100k.1": rng.integers(20, 300, n).astype(float),
+    })
+    totals.columns = ["Department", "total_hospitalizations", "per_100k", "total_deaths", "per_100k"]
+    new = rng.integers(0, 40, n)
+    recent = pd.DataFrame({
+        "Department": departments,
+        "new_hospitalizations": new,
+        "per_100k": np.where(new < 5, "<1", (new / 10).round(1).astype(str)),
+        "14_day_change": rng.normal(0, 0.5, n).round(2),
+        "Deaths": rng.random(n).round(1),
+        "per_100k.1": rng.random(n).round(2),
+    })
+    recent.columns = ["Department", "new_hospitalizations", "per_100k", "14_day_change", "Deaths", "per_100k"]
+    for i in range(8):
+        recent[" " * (i + 1)] = ""
+    return totals, recent
+
+
+def synthetic_france_history(departments, days=60, seed=0):
+    """Long-format department x date 14 day change history, a random walk per
+    department, with a few '<1' and missing rows."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-01", periods=days).strftime("%Y-%m-%d")
+    change = np.cumsum(rng.normal(0, 0.1, (days, len(departments))), axis=0).round(2)
+    history = pd.DataFrame({
+        "Department": np.tile(departments, days),
+        "date": np.repeat(dates, len(departments)),
+        "14_day_change": change.ravel().astype(str),
+    })
+    history.loc[rng.random(len(history)) < 0.01, "14_day_change"] = "<1"
+    return history.sample(frac=0.98, random_state=seed)  # some departments miss some days
+
+
+def random_points_in(map_df, n, seed=0):
+    """`n` uniformly scattered (lon, lat) points that fall inside `map_df`."""
+    import geopandas as gpd
+
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = map_df.to_crs("EPSG:4326").total_bounds
+    found = []
+    while sum(len(f) for f in found) < n:
+        xy = np.column_stack([rng.uniform(minx, maxx, 2 * n), rng.uniform(miny, maxy, 2 * n)])
+        points = gpd.points_from_xy(xy[:, 0], xy[:, 1], crs="EPSG:4326").to_crs(map_df.crs)
+        inside = np.unique(map_df.sindex.query(points, predicate="intersects")[0])
+        found.append(xy[inside])
+    return np.concatenate(found)[:n]
+
+
+def synthetic_weather(map_df, n_stations, seed=0):
+    """NOAA daily normals for `n_stations` stations x 366 days inside `map_df`."""
+    rng = np.random.default_rng(seed)
+    xy = random_points_in(map_df, n_stations, seed)
+    days = len(YEAR_DAYS)
+    dates = YEAR_DAYS.strftime("%-d-%b").to_numpy().astype(object)
+    dates[(YEAR_DAYS.month == 2) & (YEAR_DAYS.day == 29)] = "Feb-29"
+
+    season = np.sin((np.arange(days) - 105) / days * 2 * np.pi)
+    base = rng.normal(60, 8, n_stations)[:, None]
+    tmax = base + 25 * season + rng.normal(0, 2, (n_stations, days))
+    tmin = tmax - rng.uniform(20, 35, (n_stations, 1))
+    prcp = np.cumsum(rng.exponential(0.05, (n_stations, days)), axis=1)
+    snow = np.cumsum(rng.exponential(0.3, (n_stations, days)) * (season < 0), axis=1)
+
+    return pd.DataFrame({
+        "STATION": np.repeat(["USC{:08d}".format(i) for i in range(n_stations)], days),
+        "LATITUDE": np.repeat(xy[:, 1].round(4), days),
+        "LONGITUDE": np.repeat(xy[:, 0].round(4), days),
+        "DATE": np.tile(dates, n_stations),
+        "DLY-TMAX-NORMAL": tmax.ravel().round(1),
+        "DLY-TMIN-NORMAL": tmin.ravel().round(1),
+        "DLY-TAVG-NORMAL": ((tmax + tmin) / 2).ravel().round(1),
+        "YTD-PRCP-NORMAL": prcp.ravel().round(2),
+        "YTD-SNOW-NORMAL": snow.ravel().round(1),
+    })
+
+
+def check_columns(expected, loaded, columns):
+    """Raise AssertionError if any of `columns` didn't load with the values
+    it was written with (the synthetic CSVs don't list their columns in
+    schema order, so this catches columns read under the wrong name)."""
+    for col in columns:
+        if not np.allclose(loaded[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                           atol=1e-3, equal_nan=True):
+            raise AssertionError("column {!r} doesn't match the generated data".format(col))
+
+
+class Timer:
+    """Collects named phase timings for one chart."""
+
+    def __init__(self):
+        self.phases = {}
+
+    def time(self, phase, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.phases[phase] = time.perf_counter() - start
+        return result
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def bench_wholesale(work_dir, n_customers, seed=0):
+    from dataviz import wholesale
+    from dataviz.loaders import read_csv
+
+    csv_file = os.path.join(work_dir, "customers.csv")
+    synthetic_customers(n_customers, seed).to_csv(csv_file, index=False)
+    wholesale.use_style()
+
+    charts = {
+        "wholesale_boxplots": (wholesale.sorted_by_mean, wholesale.draw_boxplots),
+        "wholesale_boxplots_sketch": (lambda df: wholesale.stream_sorted_by_mean(csv_file),
+                                      wholesale.draw_boxplots),
+        "spending_per_channel": (lambda df: wholesale.group_totals(df, "channel"), wholesale.draw_channel_bars),
+        "spending_per_region": (lambda df: wholesale.group_totals(df, "region"), wholesale.draw_region_bars),
+        "fresh_vs_grocery": (None, wholesale.fresh_vs_grocery),
+    }
+    timer = Timer()
+    df = timer.time("load", read_csv, csv_file)
+    timer.time("load_warm", read_csv, csv_file)
+
+    results = []
+    for name, (aggregate, render) in charts.items():
+        chart_timer = Timer()
+        chart_timer.phases.update(timer.phases)
+        agg = chart_timer.time("aggregate", aggregate, df) if aggregate else df
+        out_file = os.path.join(work_dir, name + ".png")
+        chart_timer.time("render", render, agg, out_file)
+        results.append(_result("wholesale", name, {"rows": n_customers}, chart_timer, out_file))
+    return results
+
+
+def bench_france(work_dir, shapefile=FRANCE_SHAPEFILE, seed=0):
+    from dataviz import france
+    from dataviz.geometry import load_geometry
+
+    timer = Timer()
+    map_df = timer.time("load_geometry", load_geometry, shapefile)
+    regions = timer.time("prepare", france.departments, map_df)
+    totals, recent = synthetic_france(map_df["ADMIN_NAME"].tolist(), seed)
+    totals_file = os.path.join(work_dir, "france_totals.csv")
+    recent_file = os.path.join(work_dir, "france_recent.csv")
+    totals.to_csv(totals_file, index=False)
+    recent.to_csv(recent_file, index=False)
+    covid_df = timer.time("load", france.read_totals, totals_file)
+    covid_df2 = france.read_recent(recent_file)
+    history_file = os.path.join(work_dir, "france_history.csv")
+    synthetic_france_history(map_df["ADMIN_NAME"].tolist(), seed=seed).to_csv(history_file, index=False)
+    history_df = france.read_history(history_file)
+
+    charts = {
+        "hospitalizations": ((covid_df,), france.hospitalizations_map),
+        "14daychange": ((covid_df2,), france.change_map),
+        "department_dashboard": ((covid_df, covid_df2), france.department_dashboard),
+    }
+    results = []
+    for name, (frames, render) in charts.items():
+        chart_timer = Timer()
+        chart_timer.phases.update(timer.phases)
+        chart_timer.time("aggregate", lambda: [regions.align(df, "Department") for df in frames])
+        out_file = os.path.join(work_dir, name + ".png")
+        chart_timer.time("render", render, regions, *frames, out_file)
+        results.append(_result("france", name, {"departments": len(map_df)}, chart_timer, out_file))
+
+    chart_timer = Timer()
+    chart_timer.phases.update(timer.phases)
+    out_file = os.path.join(work_dir, "change_history.gif")
+    dates = chart_timer.time("render", france.change_history_animation, regions, history_df, out_file)
+    result = _result("france", "change_history",
+                     {"departments": len(map_df), "frames": len(dates)}, chart_timer, out_file)
+    result["frame_seconds"] = round(chart_timer.phases["render"] / max(len(dates), 1), 4)
+    results.append(result)
+    return results
+
+
+def bench_colorado(work_dir, n_stations, frames=30, processes=None, shapefile=COLORADO_SHAPEFILE, seed=0):
+    from dataviz import colorado
+    from dataviz.animation import render_animation
+    from dataviz.geometry import load_geometry
+    from dataviz.weather import CUBE_METRICS, TEMPERATURES, daily_county_cube, load_weather, station_density
+
+    timer = Timer()
+    map_df = timer.time("load_geometry", load_geometry, shapefile)
+    weather_file = os.path.join(work_dir, "weather.csv")
+    synthetic = synthetic_weather(map_df, n_stations, seed)
+    synthetic.to_csv(weather_file, index=False)
+    weather_df = timer.time("load", load_weather, weather_file, map_df, shapefile,
+                            os.path.join(work_dir, "station_counties.csv"))
+    check_columns(synthetic, weather_df, CUBE_METRICS + TEMPERATURES)
+    timer.time("load_warm", load_weather, weather_file, map_df, shapefile,
+               os.path.join(work_dir, "station_counties.csv"))
+    size = {"stations": n_stations, "rows": len(weather_df),
+            "frame_mb": round(weather_df.memory_usage(deep=True).sum() / 2**20, 1)}
+
+    results = []
+    chart_timer = Timer()
+    chart_timer.phases.update(timer.phases)
+    chart_timer.time("aggregate", station_density, weather_df)
+    out_file = os.path.join(work_dir, "weather_stations.png")
+    chart_timer.time("render", colorado.weather_stations_map, map_df, weather_df, out_file)
+    results.append(_result("colorado", "weather_stations", size, chart_timer, out_file))
+
+    chart_timer = Timer()
+    chart_timer.phases.update(timer.phases)
+    out_file = os.path.join(work_dir, "Temperatures.png")
+    chart_timer.time("render", colorado.temperature_plots, weather_df, out_file)
+    results.append(_result("colorado", "temperatures", size, chart_timer, out_file))
+
+    chart_timer = Timer()
+    chart_timer.phases.update(timer.phases)
+    metrics = ['YTD-PRCP-NORMAL', 'YTD-SNOW-NORMAL']
+    days, cube = chart_timer.time("aggregate", daily_county_cube, weather_df, map_df, metrics)
+    out_file = os.path.join(work_dir, "precip_snow.gif")
+    animate = lambda: render_animation(days[:frames], cube[:frames], metrics, shapefile, out_file,
+                                       station_density(weather_df).keys(), processes=processes,
+                                       tolerance=0.005, verbose=False, cache=False)
+    timings = chart_timer.time("render", animate)
+    result = _result("colorado", "precip_animation", dict(size, frames=len(timings)), chart_timer, out_file)
+    result["frame_seconds"] = [round(t[-1], 4) for t in timings]
+    results.append(result)
+    return results
+
+
+def _result(pipeline, chart, size, timer, out_file):
+    return {
+        "pipeline": pipeline,
+        "chart": chart,
+        "size": size,
+        "seconds": {phase: round(seconds, 4) for phase, seconds in timer.phases.items()},
+        "output_bytes": _file_size(out_file),
+    }
+
+
+def run(customers=10000, stations=100, frames=30, processes=None, pipelines=None, work_dir=None, seed=0,
+        france_shapefile=FRANCE_SHAPEFILE, colorado_shapefile=COLORADO_SHAPEFILE):
+    """Run the selected pipelines ("wholesale", "france", "colorado") and
+    return the JSON-ready report. A pipeline that fails records its error."""
+    import matplotlib
+    matplotlib.use("Agg")
+
+    pipelines = pipelines or ["wholesale", "france", "colorado"]
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "versions": _versions(),
+        "params": {"customers": customers, "stations": stations, "frames": frames,
+                   "processes": processes, "seed": seed},
+        "results": [],
+    }
+    from dataviz import loaders
+
+    saved_cache_dir = loaders.CACHE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = work_dir or tmp
+        # start from an empty load cache so "load" is a cold start
+        loaders.CACHE_DIR = tempfile.mkdtemp(dir=tmp)
+
+        runners = {
+            "wholesale": lambda: bench_wholesale(work_dir, customers, seed),
+            "france": lambda: bench_france(work_dir, france_shapefile, seed),
+            "colorado": lambda: bench_colorado(work_dir, stations, frames, processes, colorado_shapefile, seed),
+        }
+        for pipeline in pipelines:
+            try:
+                report["results"].extend(runners[pipeline]())
+            except Exception as e:
+                report["results"].append({"pipeline": pipeline, "error": "{}: {}".format(type(e).__name__, e)})
+        loaders.CACHE_DIR = saved_cache_dir
+    return report
+
+
+def _versions():
+    versions = {}
+    for module in ["numpy", "pandas", "matplotlib", "geopandas", "shapely", "pyarrow"]:
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return versions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dataviz.bench", description="Benchmark the chart pipelines.")
+    parser.add_argument("--customers", type=int, default=10000, help="synthetic wholesale customer rows")
+    parser.add_argument("--stations", type=int, default=100, help="synthetic NOAA stations (x 366 days)")
+    parser.add_argument("--frames", type=int, default=30, help="animation frames to render")
+    parser.add_argument("--processes", type=int, help="animation worker processes (default all cores)")
+    parser.add_argument("--pipelines", nargs="+", choices=["wholesale", "france", "colorado"])
+    parser.add_argument("--work-dir", help="keep generated inputs and charts here")
+    parser.add_argument("--france-shapefile", default=FRANCE_SHAPEFILE)
+    parser.add_argument("--colorado-shapefile", default=COLORADO_SHAPEFILE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+    report = run(args.customers, args.stations, args.frames, args.processes, args.pipelines,
+                 args.work_dir, args.seed, args.france_shapefile, args.colorado_shapefile)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Title: Box plot statistics
+Author: Keaton Turner
+Description: Box statistics (quartiles, whiskers, fliers) in the
+format ax.bxp draws, computed either exactly from an in-memory column or
+from mergeable quantile sketches. Sketches can be built per chunk or per
+partition (in parallel) and merged, so the raw values never need to be
+gathered and sorted in one place.
+"""
+
+import math
+
+import numpy as np
+
+
+def _sample(values, size, rng):
+    if len(values) <= size:
+        return np.asarray(values, dtype=float)
+    return rng.choice(values, size=size, replace=False)
+
+
+def box_stats(values, label=None, whis=1.5, max_fliers=1000, seed=0):
+    """Exact box statistics for one column, matching plt.boxplot's defaults.
+
+    At most `max_fliers` outliers (a random sample) are kept for drawing.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)]
+    whislo, whishi = (inside.min(), inside.max()) if len(inside) else (q1, q3)
+    fliers = values[(values < whislo) | (values > whishi)]
+    return {"label": label, "mean": values.mean(), "med": med, "q1": q1, "q3": q3,
+            "whislo": whislo, "whishi": whishi,
+            "fliers": _sample(fliers, max_fliers, np.random.default_rng(seed))}
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with a relative accuracy guarantee.
+
+    Values are counted in buckets whose width grows geometrically, so any
+    quantile is returned within `relative_accuracy` of a true data value.
+    Two sketches merge by adding bucket counts. The `tail_size` lowest and
+    highest values are kept alongside (they merge the same way) to draw the
+    most extreme fliers.
+    """
+
+    def __init__(self, relative_accuracy=0.01, tail_size=500):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.tail_size = tail_size
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.low = np.empty(0)
+        self.high = np.empty(0)
+
+    def _bucket(self, store, magnitudes):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        """Fold in an array of values (NaN is ignored)."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self._bucket(self.positive, values[values > 0])
+        self._bucket(self.negative, -values[values < 0])
+        self.zeros += int((values == 0).sum())
+        self._merge_tails(values, values)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        return self
+
+    def _merge_tails(self, low, high):
+        k = self.tail_size
+        low = np.concatenate([self.low, low])
+        if len(low) > k:
+            low = np.partition(low, k)[:k]
+        high = np.concatenate([self.high, high])
+        if len(high) > k:
+            high = np.partition(high, len(high) - k - 1)[len(high) - k:]
+        self.low, self.high = np.sort(low), np.sort(high)
+
+    def merge(self, other):
+        """Add the counts of another sketch built with the same accuracy."""
+        if self.gamma != other.gamma:
+            raise ValueError("Can't merge sketches with different relative accuracy "
+                             "(gamma {} vs {})".format(self.gamma, other.gamma))
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zeros += other.zeros
+        self._merge_tails(other.low, other.high)
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _buckets(self):
+        """Representative value and count of every bucket, in increasing order."""
+        neg = sorted(self.negative.items(), reverse=True)
+        pos = sorted(self.positive.items())
+        mid = 2 / (self.gamma + 1)
+        values = ([-mid * self.gamma ** k for k, _ in neg] + ([0.0] if self.zeros else [])
+                  + [mid * self.gamma ** k for k, _ in pos])
+        counts = [c for _, c in neg] + ([self.zeros] if self.zeros else []) + [c for _, c in pos]
+        return np.clip(values, self.min, self.max), np.cumsum(counts)
+
+    def _check_not_empty(self):
+        if self.count == 0:
+            raise ValueError("The sketch is empty, add values before asking for quantiles")
+
+    def quantile(self, q):
+        """Approximate quantile(s) `q` in [0, 1]."""
+        self._check_not_empty()
+        values, cumulative = self._buckets()
+        ranks = np.asarray(q, dtype=float) * (self.count - 1)
+        return values[np.searchsorted(cumulative, ranks, side="right")]
+
+    def box_stats(self, label=None, whis=1.5):
+        """Approximate box statistics in the format ax.bxp takes.
+
+        Fliers are the kept tail values beyond `whis` IQRs from the box, so
+        the most extreme points (including the minimum and maximum) are always
+        drawn. A whisker ends at the most extreme kept tail value within the
+        limit, or at a bucket value when the tail doesn't reach that far in.
+        """
+        q1, med, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        lo_limit, hi_limit = q1 - whis * iqr, q3 + whis * iqr
+        values, _ = self._buckets()
+        inside = values[(values >= lo_limit) & (values <= hi_limit)]
+        whislo, whishi = (inside.min(), inside.max()) if len(inside) else (q1, q3)
+        low_inside = self.low[self.low >= lo_limit]
+        if len(low_inside):
+            whislo = low_inside.min()
+        high_inside = self.high[self.high <= hi_limit]
+        if len(high_inside):
+            whishi = high_inside.max()
+        fliers = np.concatenate([self.low[self.low < lo_limit], self.high[self.high > hi_limit]])
+        return {"label": label, "mean": self.total / self.count, "med": med, "q1": q1, "q3": q3,
+                "whislo": whislo, "whishi": whishi, "fliers": fliers}
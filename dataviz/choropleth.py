@@ -0,0 +1,199 @@
+"""
+Title: Choropleth small multiples
+Author: Keaton Turner
+Description: Draws any number of metrics as a grid of choropleth maps. The
+region shapes are turned into matplotlib paths once and every panel reuses
+the same paths, only the colors, color map and norm change per metric. Data
+is joined to the shapes by looking the region names up in an index built
+once from the shapefile. A long-format history becomes a dense
+(date, region) array that is played back by recoloring a single map.
+"""
+
+import math
+import time
+
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import shapely
+from matplotlib import colors
+from matplotlib.collections import PathCollection
+from matplotlib.path import Path
+
+from dataviz.geometry import label_points
+from dataviz import profiling
+from dataviz.profiling import stage
+from dataviz.style import finish
+
+
+def geometry_paths(geoms):
+    """One compound matplotlib Path per (multi)polygon, holes included."""
+    paths = []
+    for geom in geoms:
+        rings = []
+        if geom is not None:
+            for poly in shapely.get_parts(geom):
+                rings.append(poly.exterior)
+                rings.extend(poly.interiors)
+        if rings:
+            paths.append(Path.make_compound_path(*[Path(np.asarray(ring.coords)[:, :2]) for ring in rings]))
+        else:
+            paths.append(Path(np.empty((0, 2))))
+    return paths
+
+
+def metric_norm(values, center=None, vmin=None, vmax=None):
+    """Linear norm over the data range, or a TwoSlopeNorm around `center`
+    (e.g. 0 for a change) that stays valid when all values are on one side."""
+    finite = np.asarray(values, dtype=float)
+    finite = finite[np.isfinite(finite)]
+    if len(finite) == 0:  # nothing to color, any valid range will do
+        finite = np.array([0.0, 1.0])
+    vmin = finite.min() if vmin is None else vmin
+    vmax = finite.max() if vmax is None else vmax
+    if center is None:
+        return plt.Normalize(vmin=vmin, vmax=vmax)
+    # TwoSlopeNorm needs vmin < center < vmax
+    spread = max(abs(vmax - center), abs(center - vmin)) or 1.0
+    return colors.TwoSlopeNorm(vmin=min(vmin, center - spread * 1e-6), vcenter=center,
+                               vmax=max(vmax, center + spread * 1e-6))
+
+
+class ChoroplethMap:
+    """Region shapes prepared once for any number of choropleth panels.
+
+    `key_col` holds the region names data is joined on (e.g. ADMIN_NAME for
+    the France departments).
+    """
+
+    def __init__(self, map_df, key_col):
+        self.map_df = map_df
+        self.key_col = key_col
+        self.index = pd.Index(map_df[key_col])
+        self.paths = geometry_paths(map_df.geometry.values)
+        if "LABEL_X" in map_df:  # precomputed by dataviz.geometry.load_geometry
+            self.label_points = map_df[["LABEL_X", "LABEL_Y"]].to_numpy()
+        else:
+            self.label_points = label_points(map_df)
+        xmin, ymin, xmax, ymax = map_df.total_bounds
+        self.xlim = (xmin - (xmax - xmin) * 0.02, xmax + (xmax - xmin) * 0.02)
+        self.ylim = (ymin - (ymax - ymin) * 0.02, ymax + (ymax - ymin) * 0.02)
+        # same aspect geopandas uses, degrees of longitude shrink towards the poles
+        self.aspect = "equal"
+        if map_df.crs is not None and map_df.crs.is_geographic:
+            self.aspect = 1 / math.cos(math.radians((ymin + ymax) / 2))
+
+    def cache_key_parts(self):
+        # hashed by dataviz.rendercache in place of the object
+        return self.map_df, self.key_col
+
+    def align(self, df, on, columns=None):
+        """`columns` of `df` (default all but `on`) in map row order.
+
+        Regions without a row in `df` get NaN; `df[on]` must be unique.
+        """
+        columns = [c for c in df.columns if c != on] if columns is None else list(columns)
+        return df.set_index(on)[columns].reindex(self.index)
+
+    def panel(self, ax, values, cmap="Reds", norm=None, edgecolor="0.8", linewidth=0.8):
+        """Fill the regions on `ax` by `values` (map row order). Returns the
+        collection, which works as the mappable for a colorbar."""
+        values = np.asarray(values, dtype=float)
+        collection = PathCollection(self.paths, cmap=cmap, norm=norm or metric_norm(values),
+                                    edgecolors=edgecolor, linewidths=linewidth)
+        collection.set_array(np.ma.masked_invalid(values))
+        ax.add_collection(collection)
+        ax.set_xlim(*self.xlim)
+        ax.set_ylim(*self.ylim)
+        ax.set_aspect(self.aspect)
+        ax.axis("off")
+        return collection
+
+
+def small_multiples(regions, data, metrics, ncols=3, panel_size=(8.5, 6), title_size=25,
+                    label_size=15, tick_size=10, out_file=None):
+    """Grid of choropleths, one per metric, all from the same prepared shapes.
+
+    `data` is aligned to the map rows (see `ChoroplethMap.align`). Each
+    metric is a dict with `column` and optionally `title`, `cmap` (default
+    Reds), `center` (diverging TwoSlopeNorm around it), `vmin`/`vmax`,
+    `scale` (colorbar ticks are divided by it), `label` (colorbar label) and
+    `top` (how many of the highest regions to name on the map).
+    """
+    nrows = math.ceil(len(metrics) / ncols)
+    ncols = min(ncols, len(metrics))
+    fig, axes = plt.subplots(nrows, ncols, figsize=(panel_size[0] * ncols, panel_size[1] * nrows),
+                             squeeze=False)
+    for ax in axes.flat[len(metrics):]:
+        ax.axis("off")
+
+    for ax, metric in zip(axes.flat, metrics):
+        values = data[metric["column"]].to_numpy(dtype=float)
+        norm = metric_norm(values, metric.get("center"), metric.get("vmin"), metric.get("vmax"))
+        with stage("plot"):
+            collection = regions.panel(ax, values, cmap=metric.get("cmap", "Reds"), norm=norm)
+
+        with stage("colorbar"):
+            cb = fig.colorbar(collection, ax=ax)
+            cb.ax.tick_params(labelsize = tick_size)
+        if metric.get("scale"):
+            scale_factor = metric["scale"]
+            cb.ax.yaxis.set_major_formatter(mpl.ticker.FuncFormatter(lambda x, pos, s=scale_factor: '{0:g}'.format(x/s)))
+        if metric.get("label"):
+            cb.set_label(metric["label"], rotation=270, size = label_size, labelpad = 20)
+
+        # name the highest regions at their label points
+        with stage("annotate"):
+            for row in np.argsort(-values, kind="stable")[:metric.get("top", 0)]:
+                if not np.isnan(values[row]):
+                    ax.annotate(regions.index[row], xy=tuple(regions.label_points[row]),
+                                horizontalalignment='center', size=15)
+        ax.set_title(metric.get("title", metric["column"]), fontdict={'fontsize': str(title_size), 'fontweight' : '3'})
+    return finish(fig, out_file)
+
+
+def region_history(regions, df, on, date_col, value_col):
+    """Long-format rows (region, date, value) as a dense (date, region) array.
+
+    Returns `(dates, values)` with dates sorted and regions in map row order,
+    NaN where a region has no value for a date. Rows for regions missing from
+    the map are dropped, for a repeated (date, region) the last row wins.
+    """
+    date_codes, dates = pd.factorize(df[date_col], sort=True)
+    rows = regions.index.get_indexer(df[on])
+    keep = (rows >= 0) & (date_codes >= 0)
+    values = np.full((len(dates), len(regions.index)), np.nan)
+    values[date_codes[keep], rows[keep]] = df[value_col].to_numpy(dtype=float)[keep]
+    return dates, values
+
+
+def history_frames(regions, dates, values, title, cmap="Reds", norm=None, frames=None,
+                   label=None, figsize=(15, 8), dpi=100, date_format="%Y-%m-%d"):
+    """Yield `(date, rgba)` per date of a `region_history`, drawing the map once.
+
+    Every frame only swaps the colors and the title date. `norm` defaults to
+    one over the whole history so colors compare across dates, `frames` is
+    a slice of the dates to play (default all).
+    """
+    norm = norm or metric_norm(values)
+    fig, ax = plt.subplots(figsize=figsize, dpi=dpi)
+    collection = regions.panel(ax, np.full(len(regions.index), np.nan), cmap=cmap, norm=norm)
+    cb = fig.colorbar(collection, ax=ax)
+    cb.ax.tick_params(labelsize = 15)
+    if label:
+        cb.set_label(label, rotation=270, size = 20, labelpad = 20)
+    heading = ax.set_title("", fontdict={'fontsize': '25', 'fontweight' : '3'})
+    try:
+        for i in range(len(dates))[frames or slice(None)]:
+            start = time.perf_counter()
+            collection.set_array(np.ma.masked_invalid(values[i]))
+            date = pd.Timestamp(dates[i]).strftime(date_format) if date_format else dates[i]
+            heading.set_text("{} {}".format(title, date))
+            fig.canvas.draw()
+            rgba = np.asarray(fig.canvas.buffer_rgba()).copy()
+            profiling.frame(index=i, day=date, seconds=round(time.perf_counter() - start, 4))
+            with profiling.stage("encode"):  # time spent in the writer
+                yield dates[i], rgba
+    finally:
+        plt.close(fig)
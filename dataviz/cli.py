@@ -0,0 +1,140 @@
+"""
+Title: Batch chart rendering
+Author: Keaton Turner
+Description: Renders the charts listed in a JSON config. Plotting libraries
+are only imported for the chart groups that are actually requested.
+
+Example config (relative paths are resolved against the config file):
+
+    {
+        "output_dir": "charts",
+        "charts": ["wholesale", "14daychange"],
+        "wholesale": {"customers": "wholesale_customers_data.csv"},
+        "france": {"shapefile": "fra.shp", "totals": "totals.csv", "recent": "recent.csv",
+                   "history": "history.csv"},
+        "colorado": {"shapefile": "Colorado_County_Boundaries.shp",
+                     "weather": "colorado_weather_history.csv"}
+    }
+
+`charts` may name whole groups or single charts, and each group can map chart
+names to output file names under "outputs". Charts whose input data and
+options haven't changed since the last run into the same output folder are
+skipped (see dataviz.rendercache), --force draws everything again.
+
+Each group module has `load(config)`, returning the group's data, and a
+CHARTS dict of chart name -> (default output file, inputs, draw).
+`inputs(data)` picks the slice of data the chart is drawn from (the part
+hashed for the render cache) as a tuple, or None when the config lacks
+something the chart needs, and `draw(*inputs, out_file=...)` writes it.
+"""
+
+import argparse
+import importlib
+import json
+import os
+
+from dataviz.profiling import Profiler, stage
+from dataviz.rendercache import code_key, content_key, render_if_changed
+
+# group -> module with load(config) and CHARTS
+GROUPS = {
+    "wholesale": "dataviz.wholesale",
+    "france": "dataviz.france",
+    "colorado": "dataviz.colorado",
+}
+
+# config keys that hold file paths
+PATH_KEYS = {"customers", "shapefile", "totals", "recent", "history", "weather", "county_cache", "frame_dir"}
+
+
+def read_config(config_file):
+    """Load a JSON config, resolving relative input paths against its folder."""
+    with open(config_file) as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(config_file))
+    for group in GROUPS:
+        section = config.get(group, {})
+        for key in PATH_KEYS & set(section):
+            if section[key] is not None:
+                section[key] = os.path.join(base, section[key])
+    if "output_dir" in config:
+        config["output_dir"] = os.path.join(base, config["output_dir"])
+    return config
+
+
+def selected_charts(group, chart_names, charts=None):
+    if charts is None or group in charts:
+        return list(chart_names)
+    return [name for name in chart_names if name in charts]
+
+
+def run(config, charts=None, verbose=True, force=False):
+    """Render `charts` (group or chart names, default all configured) for `config`.
+
+    Charts are only drawn when the slice of data they use, their options or
+    their code changed since they were last written, unless `force`.
+    Returns a dict of chart name -> output file.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    charts = charts or config.get("charts")
+    output_dir = config.get("output_dir", ".")
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = {}
+    for group, module_name in GROUPS.items():
+        if group not in config:
+            continue
+        module = importlib.import_module(module_name)
+        names = selected_charts(group, module.CHARTS, charts)
+        if not names:
+            continue
+        with stage(group + "/load"):
+            data = module.load(config[group])
+        outputs = config[group].get("outputs", {})
+        for name in names:
+            default_file, inputs, draw = module.CHARTS[name]
+            out_file = os.path.join(output_dir, outputs.get(name, default_file))
+            with stage(name):
+                with stage("inputs"):
+                    args = inputs(data)
+                if args is None:  # chart needs an input this config doesn't have
+                    continue
+                key = content_key(name, args, code_key(draw))
+                with stage("draw"):
+                    drawn = render_if_changed(out_file, key, lambda: draw(*args, out_file=out_file),
+                                              force=force)
+            written[name] = out_file
+            if verbose:
+                print("{}: {}{}".format(name, out_file, "" if drawn else " (unchanged)"))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dataviz", description="Render the DataViz charts.")
+    parser.add_argument("config", help="JSON config with input paths and options")
+    parser.add_argument("--charts", nargs="+", help="chart or group names (default: config 'charts' or all)")
+    parser.add_argument("--output-dir", help="override the config output_dir")
+    parser.add_argument("--force", action="store_true", help="redraw charts even if their data is unchanged")
+    parser.add_argument("--profile", metavar="REPORT", help="write a JSON report of per-stage timings and memory")
+    parser.add_argument("--cprofile", action="store_true", help="include cProfile output in the report")
+    parser.add_argument("--tracemalloc", action="store_true", help="include per-stage peak traced memory")
+    args = parser.parse_args(argv)
+    if (args.cprofile or args.tracemalloc) and not args.profile:
+        parser.error("--cprofile and --tracemalloc need --profile REPORT")
+
+    config = read_config(args.config)
+    if args.output_dir:
+        config["output_dir"] = args.output_dir
+    if not args.profile:
+        run(config, charts=args.charts, force=args.force)
+        return
+    with Profiler(cprofile=args.cprofile, memory=args.tracemalloc) as profiler:
+        run(config, charts=args.charts, force=args.force)
+    profiler.write(args.profile)
+    print(profiler.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Title: Colorado weather charts
+Author: Keaton Turner
+Description: Plots of Colorado weather data from NOAA.gov separated by county:
+a station map, temperature extremes and the daily precipitation/snow animation.
+"""
+
+import geopandas as gpd
+import matplotlib.pyplot as plt
+from colour import Color
+
+from dataviz.animation import render_animation
+from dataviz.counties import station_table
+from dataviz.geometry import load_geometry
+from dataviz.profiling import stage
+from dataviz.style import COLORS, finish
+from dataviz.weather import MONTHS, daily_county_cube, load_weather, station_density
+
+
+def weather_stations_map(map_df, weather_df, out_file=None):
+    """Station locations over the county map, county names sized by station count."""
+    density_map = station_density(weather_df)
+
+    # create geodataframe of weather station locations using lat/long,
+    # one point per station rather than one per station and day
+    stations = station_table(weather_df)
+    locations_df = gpd.GeoDataFrame(stations, geometry=gpd.points_from_xy(stations.LONGITUDE, stations.LATITUDE))
+
+    fig, ax = plt.subplots(figsize = (15,12))
+
+    with stage("plot"):
+        # generate the map
+        map_df.plot(ax = ax, color='white', edgecolor='gray')
+
+        # add station locations
+        locations_df.plot(ax = ax, color=COLORS[2], markersize = 10, marker = "o")
+
+    # formatting
+    ax.set_title("Colorado Weather Stations by County", fontdict={'fontsize': '25', 'fontweight' : '3'})
+    ax.axis("off")
+    ax.annotate('Weather Station Data: https://www.ncdc.noaa.gov/cdo-web/', xy=(0.40, .14), xycoords='figure fraction', fontsize=15, color='grey')
+
+    # Add county annotations sized by # of stations in that particular county
+    with stage("annotate"):
+        for idx, row in map_df.iterrows():
+            if row["COUNTY"] in density_map:
+                ax.annotate(row['COUNTY'], xy=row['coords'],horizontalalignment='center',size=(6+density_map[row["COUNTY"]])/1.5)
+    return finish(fig, out_file)
+
+
+def temperature_plots(weather_df, out_file=None):
+    """Hottest/coldest month by county and Baca county monthly temperature swings."""
+    # gather temperature maximum data (aggregated using mean values)
+    use_col = "DLY-TMAX-NORMAL"
+    hottest_month = weather_df.groupby(["MONTH","DAY"])[use_col].mean().idxmax()[0]
+    hottest_df = weather_df[weather_df["MONTH"]==hottest_month]
+    hottest_counties = hottest_df.groupby("COUNTY")[use_col].mean().nlargest(5).index.tolist()
+
+    # gather temperature minimum data (aggregated using mean values)
+    use_col = "DLY-TMIN-NORMAL"
+    coldest_month = weather_df.groupby(["MONTH","DAY"])[use_col].mean().idxmin()[0]
+    coldest_df = weather_df[weather_df["MONTH"]==coldest_month]
+    coldest_counties = coldest_df.groupby("COUNTY")[use_col].mean().nlargest(5).index.tolist()
+
+    fig = plt.figure(figsize = (12,6))
+
+    # High Temp plot
+    use_col = "DLY-TMAX-NORMAL"
+    dark_red = Color("#8B0000")
+    light_red = Color("#FF7F7F")
+    reds = list(dark_red.range_to(light_red,5))
+    ax = fig.add_subplot(221)
+    daily = hottest_df[hottest_df["COUNTY"].isin(hottest_counties)].groupby(["COUNTY","DAY"])[use_col].mean()
+    for i,county in enumerate(hottest_counties):
+        data = daily.loc[county]
+        ax.scatter(data.index, data, color = reds[i].rgb, label = county)
+    ax.spines['right'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+    ax.set_xticks([])
+    ax.set_title(MONTHS[hottest_month-1], fontsize = 20)
+    ax.legend(loc ='upper left',bbox_to_anchor=(-.4,1), frameon=False)
+
+    # Low Temp plot
+    use_col = "DLY-TMIN-NORMAL"
+    dark_blue = Color("#00008B")
+    light_blue = Color("#ADD8E6")
+    blues = list(light_blue.range_to(dark_blue,5))
+    ax2 = fig.add_subplot(223)
+    daily = coldest_df[coldest_df["COUNTY"].isin(coldest_counties)].groupby(["COUNTY","DAY"])[use_col].mean()
+    for i,county in enumerate(coldest_counties):
+        data = daily.loc[county]
+        ax2.scatter(data.index, data, color = blues[i].rgb, label = county)
+    ax2.spines['right'].set_visible(False)
+    ax2.spines['top'].set_visible(False)
+    ax2.set_xticks([])
+    ax2.set_title(MONTHS[coldest_month-1], fontsize = 20)
+    ax2.legend(loc ='upper left',bbox_to_anchor=(-.43,1), frameon=False)
+
+    # BACA county temperature swings plot
+    months = MONTHS
+    baca = weather_df[weather_df["COUNTY"]=="BACA"].groupby("MONTH")[
+        ["DLY-TAVG-NORMAL","DLY-TMIN-NORMAL","DLY-TMAX-NORMAL"]].mean().reindex(range(1,13))
+    tmid = baca["DLY-TAVG-NORMAL"].to_numpy()
+    tmin = baca["DLY-TMIN-NORMAL"].to_numpy()
+    tmax = baca["DLY-TMAX-NORMAL"].to_numpy()
+
+    ax3 = fig.add_subplot(122)
+    ax3.errorbar(months,tmid,yerr=(tmid-tmin,tmax-tmid),
+                 linestyle="", color = "green")
+    ax3.axhspan(0,32, facecolor=COLORS[0], alpha = 0.5)
+    ax3.annotate("Freezing", xy=(4.5,18), color='gray', size = 12)
+    ax3.spines['right'].set_visible(False)
+    ax3.spines['top'].set_visible(False)
+    ax3.tick_params(axis='x', rotation=90, labelsize = 12)
+    ax3.set_ylim(0,97)
+    ax3.set_title("Baca County Temperature Swings", fontsize = 14)
+    return finish(fig, out_file)
+
+
+def precip_snow_animation(weather_df, map_df, map_file, out_file, frame_dir=None, tolerance=0.005,
+                          processes=None, fps=10, verbose=True):
+    """Cumulative snow/rain totals by county per day, streamed into `out_file`.
+
+    `map_df` must be `map_file` in file row order. `frame_dir` also keeps the
+    individual PNGs, `tolerance` simplifies the county outlines (in degrees,
+    None keeps full resolution). Frames whose data hasn't changed since the
+    last run are read back from the frame cache. Returns the timings of the
+    frames that were rendered.
+    """
+    # one pass over the weather data for every day/county/metric,
+    # rows line up with map_df so each frame is just a slice of the cube
+    cube_metrics = ['YTD-PRCP-NORMAL', 'YTD-SNOW-NORMAL']
+    with stage("cube"):
+        days, cube = daily_county_cube(weather_df, map_df, metrics=cube_metrics)
+
+    # frames are drawn in parallel, each worker loads the county shapes and
+    # builds the figure once, then only recolors it for every day
+    return render_animation(days, cube, cube_metrics, map_file, out_file, station_density(weather_df).keys(),
+                            fps=fps, frame_dir=frame_dir, processes=processes, tolerance=tolerance,
+                            verbose=verbose)
+
+
+def load(config):
+    """Inputs for the CLI: `shapefile`, `weather` CSV, optional `county_cache`
+    CSV, `use_geocoder` and the animation options `frame_dir`, `tolerance`,
+    `processes` and `fps`."""
+    map_df = load_geometry(config["shapefile"])
+    weather_df = load_weather(config["weather"], map_df, config["shapefile"],
+                              county_cache_file=config.get("county_cache"),
+                              use_geocoder=config.get("use_geocoder", False))
+    return {"map_df": map_df, "weather_df": weather_df, "config": config}
+
+
+def _animation(data, out_file):
+    # frame timings go to the caller (and to --profile), the CLI prints its own line
+    config = data["config"]
+    return precip_snow_animation(data["weather_df"], data["map_df"], config["shapefile"], out_file,
+                                    frame_dir=config.get("frame_dir"),
+                                    tolerance=config.get("tolerance", 0.005),
+                                    processes=config.get("processes"), fps=config.get("fps", 10),
+                                    verbose=False)
+
+
+CHARTS = {
+    "weather_stations": ("weather_stations.png",
+                         lambda data: (data["map_df"], data["weather_df"]), weather_stations_map),
+    "temperatures": ("Temperatures.png", lambda data: (data["weather_df"],), temperature_plots),
+    # the animation also caches each frame, so a new day only draws one frame
+    "precip_animation": ("precip_snow.gif", lambda data: (data,), _animation),
+}
@@ -0,0 +1,102 @@
+"""
+Title: Station to county lookup
+Author: Keaton Turner
+Description: Assigns weather stations to a county with a point-in-polygon
+join against the county boundary shapefile. Results are cached on disk keyed
+by station and location, and the Nominatim geocoder is only used (optionally)
+for stations that fall outside every county polygon.
+"""
+
+import os
+
+import geopandas as gpd
+import pandas as pd
+
+from dataviz.profiling import count, stage
+
+STATION_KEYS = ["STATION", "LATITUDE", "LONGITUDE"]
+
+
+def station_table(weather_df):
+    """One row per (STATION, LATITUDE, LONGITUDE) in the weather data."""
+    return weather_df[STATION_KEYS].drop_duplicates().reset_index(drop=True)
+
+
+def spatial_join(stations, map_df, county_col="COUNTY"):
+    """Vectorized point-in-polygon join of station locations to counties.
+
+    The spatial index (an STRtree) prefilters candidates by bounding box
+    before the exact intersects test. Stations outside every polygon get NaN.
+    """
+    points = gpd.points_from_xy(stations["LONGITUDE"], stations["LATITUDE"], crs="EPSG:4326")
+    if map_df.crs is not None:
+        points = points.to_crs(map_df.crs)
+
+    point_idx, poly_idx = map_df.sindex.query(points, predicate="intersects")
+
+    # a point on a shared border hits two counties, keep the first one
+    hits = pd.Series(poly_idx, index=point_idx)
+    hits = hits[~hits.index.duplicated(keep="first")]
+    counties = pd.Series(map_df[county_col].to_numpy()[hits.to_numpy()], index=hits.index)
+    return counties.reindex(range(len(stations))).to_numpy()
+
+
+def geocode_counties(stations, user_agent="myGeocoder"):
+    """Look up counties one station at a time with Nominatim (slow, needs network)."""
+    from geopy.geocoders import Nominatim
+    from geopy.extra.rate_limiter import RateLimiter
+
+    locator = Nominatim(user_agent=user_agent)
+    reverse = RateLimiter(locator.reverse, min_delay_seconds=1)
+    counties = []
+    for lat, lon in zip(stations["LATITUDE"], stations["LONGITUDE"]):
+        location = reverse("{},{}".format(lat, lon))
+        county = None
+        if location is not None:
+            county = location.raw.get("address", {}).get("county")
+        counties.append(county.replace(" County", "").upper() if county else None)
+    return counties
+
+
+def read_cache(cache_file):
+    """Previously resolved stations, or None if there is no cache yet."""
+    if cache_file is None or not os.path.exists(cache_file):
+        return None
+    return pd.read_csv(cache_file)
+
+
+def resolve_counties(weather_df, map_df, cache_file=None, use_geocoder=False, county_col="COUNTY"):
+    """Return the station table of `weather_df` with a COUNTY column.
+
+    Stations already in `cache_file` are reused, the rest are matched against
+    the polygons in `map_df` and, if `use_geocoder` is set, anything still
+    unmatched is sent to Nominatim. Newly resolved stations are added to the cache.
+    """
+    stations = station_table(weather_df)
+    cached = read_cache(cache_file)
+    if cached is None:
+        stations["COUNTY"] = None
+    else:
+        stations = stations.merge(cached, how="left", on=STATION_KEYS)
+
+    missing = stations["COUNTY"].isna()
+    if missing.any():
+        todo = stations.loc[missing, STATION_KEYS].reset_index(drop=True)
+        with stage("spatial_join"):
+            found = spatial_join(todo, map_df, county_col=county_col)
+
+        outside = pd.isna(found)
+        if use_geocoder and outside.any():
+            with stage("geocode"):
+                found[outside] = geocode_counties(todo.loc[outside])
+            count("stations_geocoded", int(outside.sum()))
+
+        stations.loc[missing, "COUNTY"] = found
+
+        # only cache stations we actually resolved so the geocoder can retry the rest
+        if cache_file is not None:
+            resolved = pd.concat([cached, stations.dropna(subset=["COUNTY"])])
+            resolved = resolved.drop_duplicates(subset=STATION_KEYS, keep="last")
+            resolved.to_csv(cache_file, index=False)
+
+    return stations
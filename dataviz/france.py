@@ -0,0 +1,193 @@
+"""
+Title: France COVID choropleths
+Author: Keaton Turner
+Description: Choropleth maps of France covid data separated by department,
+drawn with dataviz.choropleth so the department shapes are prepared once.
+"""
+
+import pandas as pd
+
+from dataviz.animation import write_animation
+from dataviz.choropleth import ChoroplethMap, history_frames, metric_norm, region_history, small_multiples
+from dataviz.geometry import load_geometry
+from dataviz.loaders import CENSORED, read_typed_csv
+from dataviz.style import finish
+
+SOURCE = 'Source: https://www.nytimes.com/interactive/2021/world/france-covid-cases.html'
+
+# (header in the CSV, column name, dtype) for the two NYT department extracts;
+# both list per_100k twice (hospitalizations, then deaths)
+TOTALS_SCHEMA = [
+    ("Department", "Department", "str"),
+    ("total_hospitalizations", "total_hospitalizations", "float64"),
+    ("per_100k", "per_100k", "float64"),
+    ("total_deaths", "total_deaths", "float64"),
+    ("per_100k", "deaths_per_100k", "float64"),
+]
+RECENT_SCHEMA = [
+    ("Department", "Department", "str"),
+    ("new_hospitalizations", "new_hospitalizations", "float64"),
+    ("per_100k", "per_100k", CENSORED),  # "<1" for small departments
+    ("14_day_change", "14_day_change", "float64"),
+    ("Deaths", "Deaths", "float64"),
+    ("per_100k", "deaths_per_100k", CENSORED),
+]
+
+
+def read_totals(path):
+    """Cumulative hospitalizations/deaths per department, typed."""
+    return read_typed_csv(path, TOTALS_SCHEMA)
+
+
+def read_recent(path):
+    """Recent hospitalizations/deaths per department, "<1" values parsed to
+    1.0 with a `<column>_censored` flag."""
+    return read_typed_csv(path, RECENT_SCHEMA)
+
+
+def read_history(path, value_col="14_day_change", date_col="date"):
+    """Long-format department history, one row per department and date."""
+    schema = [("Department", "Department", "str"),
+              (date_col, date_col, "str"),
+              (value_col, value_col, CENSORED)]
+    history_df = read_typed_csv(path, schema)
+    history_df[date_col] = pd.to_datetime(history_df[date_col])
+    return history_df
+
+
+def departments(map_df):
+    """Department shapes prepared for choropleths, data is joined on ADMIN_NAME.
+
+    Pass the result instead of `map_df` to draw several charts from the same
+    prepared shapes.
+    """
+    if isinstance(map_df, ChoroplethMap):
+        return map_df
+    return ChoroplethMap(map_df, "ADMIN_NAME")
+
+
+def hospitalizations_map(map_df, covid_df, out_file=None):
+    """Total hospitalizations and hospitalizations per 100k, side by side."""
+    regions = departments(map_df)
+    data = regions.align(covid_df, "Department")
+
+    metrics = [
+        {"column": "total_hospitalizations", "title": "Total Hospitalizations",
+         "scale": 10**3, "label": "x10^3"},
+        {"column": "per_100k", "title": "Hospitalizations (per 100k)",
+         "scale": 10**3, "label": "x10^3"},
+    ]
+    fig = small_multiples(regions, data, metrics, ncols=2, panel_size=(8.5, 6))
+
+    # add an annotation
+    fig.axes[0].annotate(SOURCE, xy=(0.35, .05), xycoords='figure fraction', fontsize=15, color='grey')
+    return finish(fig, out_file)
+
+
+def change_map(map_df, covid_df, out_file=None):
+    """14 day change in hospitalizations on a diverging scale, top 2 labelled."""
+    regions = departments(map_df)
+    data = regions.align(covid_df, "Department")
+
+    metrics = [{"column": "14_day_change", "title": "14 Day Change", "cmap": "bwr", "center": 0,
+                "label": "Percentage", "top": 2}]
+    fig = small_multiples(regions, data, metrics, ncols=1, panel_size=(30, 15), label_size=20,
+                          tick_size=20)
+
+    # add an annotation
+    fig.axes[0].annotate(SOURCE, xy=(0.24, .05), xycoords='figure fraction', fontsize=25, color='grey')
+    return finish(fig, out_file)
+
+
+# every numeric column of both extracts, recent ones suffixed with _recent
+DASHBOARD_METRICS = [
+    {"column": "total_hospitalizations", "title": "Total Hospitalizations", "scale": 10**3, "label": "x10^3"},
+    {"column": "per_100k", "title": "Hospitalizations (per 100k)"},
+    {"column": "total_deaths", "title": "Total Deaths"},
+    {"column": "deaths_per_100k", "title": "Deaths (per 100k)"},
+    {"column": "new_hospitalizations_recent", "title": "New Hospitalizations"},
+    {"column": "per_100k_recent", "title": "New Hospitalizations (per 100k)"},
+    {"column": "14_day_change_recent", "title": "14 Day Change", "cmap": "bwr", "center": 0},
+    {"column": "Deaths_recent", "title": "New Deaths"},
+    {"column": "deaths_per_100k_recent", "title": "New Deaths (per 100k)"},
+]
+
+
+def department_dashboard(map_df, covid_df, covid_df2, out_file=None, metrics=DASHBOARD_METRICS, ncols=3):
+    """Grid of department maps, one per metric of the totals and recent data."""
+    regions = departments(map_df)
+    data = pd.concat([regions.align(covid_df, "Department"),
+                      regions.align(covid_df2, "Department").add_suffix("_recent")], axis=1)
+    fig = small_multiples(regions, data, metrics, ncols=ncols, panel_size=(7, 5), title_size=16)
+    fig.suptitle("France Covid by Department", fontsize=30)
+    fig.axes[0].annotate(SOURCE, xy=(0.3, .01), xycoords='figure fraction', fontsize=15, color='grey')
+    return finish(fig, out_file)
+
+
+def change_history_animation(map_df, history_df, out_file, value_col="14_day_change", date_col="date",
+                             start=None, end=None, fps=5):
+    """Per-date 14 day change maps (bwr around 0) streamed into `out_file`.
+
+    The history is indexed once into a dense date x department array and
+    the diverging norm is computed once over all of it, so every date uses
+    the same colors; `start`/`end` (dates, inclusive) only pick which frames
+    are written, a range without any dates raises ValueError. Returns the
+    dates drawn.
+    """
+    regions = departments(map_df)
+    dates, values = region_history(regions, history_df, "Department", date_col, value_col)
+    norm = metric_norm(values, center=0)
+    first = dates.searchsorted(pd.Timestamp(start)) if start else 0
+    last = dates.searchsorted(pd.Timestamp(end), side="right") if end else len(dates)
+    if first >= last:
+        span = "{} to {}".format(dates[0].date(), dates[-1].date()) if len(dates) else "no dates"
+        raise ValueError("No history dates between {} and {} (the history has {})".format(
+            start or "the start", end or "the end", span))
+
+    drawn = []
+
+    def frames():
+        for date, rgba in history_frames(regions, dates, values, "14 Day Change", cmap="bwr", norm=norm,
+                                         frames=slice(first, last), label="Percentage"):
+            drawn.append(date)
+            yield rgba
+
+    write_animation(frames(), out_file, fps=fps)
+    return drawn
+
+
+def load(config):
+    """Inputs for the CLI: `shapefile`, `totals` and `recent` department CSVs,
+    optional `tolerance` to simplify the department outlines and `history`, a
+    long-format department/date CSV for the change animation (`history_start`
+    and `history_end` limit the dates played)."""
+    map_df = load_geometry(config["shapefile"], tolerance=config.get("tolerance"))
+    return {
+        "map_df": map_df,
+        "regions": departments(map_df), # shared by every chart
+        "covid_df": read_totals(config["totals"]),
+        "covid_df2": read_recent(config["recent"]),
+        "history_df": read_history(config["history"]) if config.get("history") else None,
+        "config": config,
+    }
+
+
+def _history(data):
+    if data["history_df"] is None:
+        return None  # not configured, the CLI skips the chart
+    config = data["config"]
+    return data["regions"], data["history_df"], config.get("history_start"), config.get("history_end")
+
+
+CHARTS = {
+    "hospitalizations": ("hospitalizations.png",
+                         lambda data: (data["regions"], data["covid_df"]), hospitalizations_map),
+    "14daychange": ("14daychange.png",
+                    lambda data: (data["regions"], data["covid_df2"]), change_map),
+    "department_dashboard": ("department_dashboard.png",
+                             lambda data: (data["regions"], data["covid_df"], data["covid_df2"]),
+                             department_dashboard),
+    "change_history": ("14daychange_history.gif", _history,
+                       lambda regions, history_df, start, end, out_file: change_history_animation(
+                           regions, history_df, out_file, start=start, end=end)),
+}
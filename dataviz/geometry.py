@@ -0,0 +1,61 @@
+"""
+Title: Geometry preparation
+Author: Keaton Turner
+Description: Computes map label anchor points once per shapefile and, when
+asked, reprojects and simplifies the outlines for the choropleth renderers.
+Small thumbnail frames don't need full-resolution county borders.
+"""
+
+import os
+
+import shapely
+
+from dataviz.loaders import cached, read_file
+
+
+def label_points(gdf):
+    """(n, 2) array of representative points, one vectorized call for all rows."""
+    return shapely.get_coordinates(shapely.point_on_surface(gdf.geometry.values))
+
+
+def simplify(gdf, tolerance):
+    """Simplify outlines while keeping shared borders between neighbours intact.
+
+    Uses coverage simplification (shapely >= 2.1) so adjacent polygons don't
+    open gaps or overlap, falling back to per-polygon topology preserving
+    simplification when that isn't available or the shapes aren't a clean
+    coverage. `tolerance` is in the units of the CRS.
+    """
+    geoms = gdf.geometry.values
+    try:
+        simplified = shapely.coverage_simplify(geoms, tolerance)
+    except (AttributeError, shapely.errors.GEOSException):
+        simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+    return gdf.set_geometry(gdf.geometry.__class__(simplified, index=gdf.index, crs=gdf.crs))
+
+
+def prepare_geometry(gdf, tolerance=None, crs=None):
+    """Copy of `gdf` reprojected to `crs`, with LABEL_X/LABEL_Y anchor columns
+    (from the full-resolution shapes) and outlines simplified by `tolerance`."""
+    gdf = gdf.copy()
+    if crs is not None:
+        gdf = gdf.to_crs(crs)
+    points = label_points(gdf)
+    gdf["LABEL_X"] = points[:, 0]
+    gdf["LABEL_Y"] = points[:, 1]
+    if tolerance:
+        gdf = simplify(gdf, tolerance)
+    return gdf
+
+
+def load_geometry(path, tolerance=None, crs=None):
+    """Read a shapefile and prepare it, caching the result per tolerance/CRS.
+
+    The returned frame also has the `coords` column of (x, y) label tuples
+    the scripts annotate with.
+    """
+    name = os.path.splitext(os.path.basename(path))[0] + "-prepared"
+    gdf = cached(name, [path], lambda: prepare_geometry(read_file(path), tolerance, crs),
+                 geo=True, options=(tolerance, str(crs)))
+    gdf["coords"] = list(zip(gdf["LABEL_X"], gdf["LABEL_Y"]))
+    return gdf
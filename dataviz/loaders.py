@@ -0,0 +1,192 @@
+"""
+Title: Cached data loading
+Author: Keaton Turner
+Description: Drop-in replacements for pd.read_csv and gpd.read_file that keep
+a Parquet (GeoParquet for shapefiles) copy of the parsed frame on disk. The
+cache entry is keyed by the source path, size and modification time and by
+the code that builds it, so a changed input or parser is re-run and a warm
+start skips parsing entirely.
+`read_typed_csv` also checks the header against a declared schema and
+parses only the declared columns, with fixed dtypes.
+"""
+
+import csv
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+from dataviz.profiling import count, stage
+
+CACHE_DIR = os.environ.get("DATAVIZ_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "dataviz"))
+
+# schema dtype for numbers that may be reported as "<x" (below a threshold)
+CENSORED = "censored"
+# cell values that mean "no data" in the typed CSVs (the NYT extracts use a dash)
+NA_VALUES = ["", "\u2014", "-", "NA", "N/A"]
+
+# a shapefile is only valid together with its sidecar files
+SHAPEFILE_PARTS = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _source_files(path):
+    stem, ext = os.path.splitext(path)
+    if ext.lower() != ".shp":
+        return [path]
+    return [stem + part for part in SHAPEFILE_PARTS if os.path.exists(stem + part)]
+
+
+def _source_state(paths):
+    """Size and mtime of every file the cached frame was built from."""
+    state = []
+    for path in paths:
+        for f in _source_files(path):
+            st = os.stat(f)
+            state.append("{}:{}:{}".format(os.path.abspath(f), st.st_size, st.st_mtime_ns))
+    return "|".join(state)
+
+
+def _have_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cached(name, sources, build, geo=False, cache_dir=None, options=None):
+    """Return `build()`, going through an on-disk Parquet copy when it's current.
+
+    `name` plus `options` identify the entry, `sources` are the files it was
+    built from. When any source or the file `build` is defined in changes
+    size or mtime the frame is rebuilt and the stale entry replaced. Without
+    pyarrow this just calls `build()`.
+    """
+    if not _have_parquet():
+        return build()
+
+    cache_dir = cache_dir or CACHE_DIR
+    sources = [sources] if isinstance(sources, str) else list(sources)
+    entry = "{}-{}".format(name, _digest(repr((sorted(map(os.path.abspath, sources)), options))))
+    from dataviz.rendercache import code_key  # imports this module
+
+    state = _source_state(sources) + "|" + code_key(build)
+    cache_file = os.path.join(cache_dir, "{}-{}.parquet".format(entry, _digest(state)))
+
+    if os.path.exists(cache_file):
+        count("cache_hits")
+        if geo:
+            import geopandas as gpd
+            return gpd.read_parquet(cache_file)
+        return pd.read_parquet(cache_file)
+
+    count("cache_misses")
+    with stage("build " + name):
+        df = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(cache_dir, glob.escape(entry) + "-*.parquet")):
+        os.remove(stale)
+    # write then rename so parallel readers never see a partial file
+    tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+    df.to_parquet(tmp_file)
+    os.replace(tmp_file, cache_file)
+    return df
+
+
+def read_csv(path, cache_dir=None, **kwargs):
+    """pd.read_csv with a Parquet cache; `kwargs` are part of the cache key."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return cached(name, [path], lambda: pd.read_csv(path, **kwargs),
+                  cache_dir=cache_dir, options=sorted(kwargs.items()))
+
+
+def read_file(path, cache_dir=None, **kwargs):
+    """gpd.read_file with a GeoParquet cache (geometries and CRS included)."""
+    import geopandas as gpd
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return cached(name, [path], lambda: gpd.read_file(path, **kwargs), geo=True,
+                  cache_dir=cache_dir, options=sorted(kwargs.items()))
+
+
+def _csv_engine():
+    return "pyarrow" if _have_parquet() else "c"
+
+
+def _read_header(path):
+    # utf-8-sig drops the byte order mark Excel puts in front of the first name
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return [name.strip() for name in next(csv.reader(f))]
+
+
+def _schema_positions(path, header, schema):
+    """File column index of every schema entry; a header listed twice in the
+    schema matches its first, then second, ... occurrence in the file."""
+    seen = {}
+    positions = []
+    for column, name, dtype in schema:
+        matches = [i for i, h in enumerate(header) if h == column]
+        k = seen.get(column, 0)
+        if k >= len(matches):
+            raise ValueError("{}: expected column {!r} (occurrence {}) for {!r}, header is {}".format(
+                path, column, k + 1, name, [h for h in header if h]))
+        seen[column] = k + 1
+        positions.append(matches[k])
+    return positions
+
+
+def parse_censored(values):
+    """Numbers that may be given as "<x": returns (float values, censored flags).
+
+    A censored value is stored as its bound `x`, flagged True.
+    """
+    text = values.astype("str").str.strip()
+    flags = text.str.startswith("<").fillna(False).to_numpy(dtype=bool)
+    return pd.to_numeric(text.str.lstrip("<"), errors="raise").astype("float64"), flags
+
+
+def read_typed_csv(path, schema, cache_dir=None):
+    """Read the columns declared in `schema` from `path` with fixed dtypes.
+
+    `schema` is a list of (header in the file, column name, dtype). Header
+    names may repeat (matched in order) and undeclared or empty columns are
+    skipped. `CENSORED` columns hold "<x" style values and become floats
+    plus a bool `<name>_censored` column, `NA_VALUES` are read as missing.
+    A missing column or a value that doesn't fit its dtype raises ValueError
+    naming the file. Parsed with the pyarrow engine when it's installed, and
+    cached like `read_csv`.
+    """
+    def build():
+        positions = _schema_positions(path, _read_header(path), schema)
+        # read in file order, the pyarrow engine returns usecols in the order
+        # given and numbers them 0.. so dtypes are keyed by that position
+        order = sorted(range(len(schema)), key=positions.__getitem__)
+        engine = _csv_engine()
+        usecols = [positions[i] for i in order]
+        dtypes = {}
+        for n, i in enumerate(order):
+            dtype = schema[i][2]
+            dtypes[n if engine == "pyarrow" else usecols[n]] = "str" if dtype == CENSORED else dtype
+        try:
+            df = pd.read_csv(path, header=None, skiprows=1, usecols=usecols, dtype=dtypes,
+                             na_values=NA_VALUES, encoding="utf-8-sig", engine=engine)
+        except ValueError as e:
+            raise ValueError("{}: {}".format(path, e)) from e
+        df.columns = [schema[i][1] for i in order]
+        df = df[[name for _, name, _ in schema]]
+        for _, name, dtype in schema:
+            if dtype == CENSORED:
+                try:
+                    df[name], df[name + "_censored"] = parse_censored(df[name])
+                except ValueError as e:
+                    raise ValueError("{}: column {!r}: {}".format(path, name, e)) from e
+        return df
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return cached(name, [path], build, cache_dir=cache_dir, options=("typed", list(schema)))
@@ -0,0 +1,188 @@
+"""
+Title: Pipeline profiling
+Author: Keaton Turner
+Description: Stage timers, counters and per-frame timings for the plotting
+pipelines, with optional cProfile and tracemalloc capture. Library code
+marks its stages with `stage("name")` and `count("name")`, which do nothing
+unless a `Profiler` is running, so they can stay in place for normal runs.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# the running Profiler, if any
+_active = None
+
+
+def _rss_peak_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Profiler:
+    """Collects one run's stages, counters and frames into a report.
+
+    Stages nest, each is reported under its path (e.g. "colorado/load/parse")
+    with the number of calls, total seconds and, with `memory`, the peak
+    traced allocation while it ran. `cprofile` also keeps the functions with
+    the most cumulative time.
+    """
+
+    def __init__(self, cprofile=False, memory=False, top=25):
+        self.cprofile = cprofile
+        self.memory = memory
+        self.top = top
+        self.stages = {}
+        self.counters = {}
+        self.frames = []
+        self._stack = []
+        self._profile = None
+        self._started = None
+        self.wall_seconds = None
+
+    def start(self):
+        global _active
+        if self.memory:
+            tracemalloc.start()
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+        _active = self
+        return self
+
+    def stop(self):
+        global _active
+        self.wall_seconds = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        if self.memory:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        _active = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name):
+        path = "/".join([s["name"] for s in self._stack] + [name])
+        frame = {"name": name, "peak": 0}
+        if self.memory:
+            # a stage's peak is measured from its own start, parents keep the max
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            entry = self.stages.setdefault(path, {"stage": path, "calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            if self.memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame["peak"])
+                entry["peak_mb"] = max(entry.get("peak_mb", 0), round(peak / 2**20, 2))
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def frame(self, **fields):
+        """Record one animation frame (index, day, seconds and its phases)."""
+        self.frames.append(fields)
+
+    def report(self):
+        """The run as a JSON-ready dict."""
+        report = {
+            "wall_seconds": round(self.wall_seconds or 0, 4),
+            "peak_rss_mb": _rss_peak_mb(),
+            "stages": [dict(s, seconds=round(s["seconds"], 4)) for s in self.stages.values()],
+            "counters": self.counters,
+        }
+        if self.memory:
+            report["traced_peak_mb"] = round(self.traced_peak / 2**20, 2)
+        if self.frames:
+            rendered = [f["seconds"] for f in self.frames if not f.get("cached")]
+            report["frames"] = {
+                "count": len(self.frames),
+                "rendered": len(rendered),
+                "mean_seconds": round(sum(rendered) / len(rendered), 4) if rendered else None,
+                "max_seconds": round(max(rendered), 4) if rendered else None,
+                "per_frame": self.frames,
+            }
+        if self._profile is not None:
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            report["cprofile"] = out.getvalue()
+        return report
+
+    def write(self, path):
+        """Write `report()` as JSON (and the raw cProfile data next to it)."""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        if self._profile is not None:
+            self._profile.dump_stats(os.path.splitext(path)[0] + ".prof")
+
+    def summary(self):
+        """Short text table of the stages, slowest first."""
+        lines = ["{:<50} {:>6} {:>9}".format("stage", "calls", "seconds")]
+        for s in sorted(self.stages.values(), key=lambda s: -s["seconds"]):
+            lines.append("{:<50} {:>6} {:>9.3f}".format(s["stage"], s["calls"], s["seconds"]))
+        lines.append("wall {:.3f}s, peak RSS {} MB".format(self.wall_seconds or 0, _rss_peak_mb()))
+        return "\n".join(lines)
+
+
+def detach():
+    """Stop tracing in a forked worker, which inherits the parent's profiler
+    hooks but reports nothing back through them."""
+    global _active
+    _active = None
+    sys.setprofile(None)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as `name` when a Profiler is running."""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+def count(name, n=1):
+    """Add `n` to counter `name` when a Profiler is running."""
+    if _active is not None:
+        _active.count(name, n)
+
+
+def frame(**fields):
+    """Record an animation frame when a Profiler is running."""
+    if _active is not None:
+        _active.frame(**fields)
@@ -0,0 +1,168 @@
+"""
+Title: Render cache
+Author: Keaton Turner
+Description: Skips re-drawing charts whose inputs haven't changed. Every
+render gets a content key, a hash of the data slice it is drawn from plus
+its parameters and the code that draws it. Finished charts are tracked per
+output folder in a small manifest, animation frames are kept as PNGs named
+by their key so unchanged days are read back instead of drawn again.
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dataviz import loaders
+
+MANIFEST = ".dataviz-renders.json"
+
+
+def _update(h, obj):
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode("utf-8"))
+        for col in obj.columns:
+            _update(h, obj[col])
+    elif isinstance(obj, pd.Series) and obj.dtype.name == "geometry":
+        import shapely
+        h.update(b"".join(shapely.to_wkb(np.asarray(obj.array))))
+    elif isinstance(obj, pd.Series):
+        try:
+            hashed = pd.util.hash_pandas_object(obj, index=False).to_numpy()
+        except TypeError:  # e.g. tuples, hash their text instead
+            hashed = pd.util.hash_pandas_object(obj.astype(str), index=False).to_numpy()
+        h.update(hashed.tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode("utf-8"))
+        if obj.dtype == object:
+            _update(h, pd.Series(obj.ravel()))
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            h.update(repr(key).encode("utf-8"))
+            _update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update("{}:{}".format(type(obj).__name__, len(obj)).encode("utf-8"))
+        for item in obj:
+            _update(h, item)
+    elif isinstance(obj, (set, frozenset)):
+        _update(h, sorted(obj, key=repr))
+    elif hasattr(obj, "cache_key_parts"):
+        _update(h, obj.cache_key_parts())
+    elif callable(obj):
+        _update(h, code_key(obj))
+    else:
+        h.update(repr(obj).encode("utf-8"))
+    h.update(b"|")
+
+
+def content_key(*parts):
+    """Hash of frames, arrays, containers and plain values, as a hex string.
+
+    Functions hash as the name and current state of their source file, so
+    editing the code that draws a chart invalidates it too. Objects with a
+    `cache_key_parts()` method hash as what it returns.
+    """
+    h = hashlib.sha1()
+    for part in parts:
+        _update(h, part)
+    return h.hexdigest()
+
+
+def code_key(func):
+    """Qualified name of `func` plus the size/mtime of the file it lives in."""
+    name = "{}.{}".format(getattr(func, "__module__", ""), getattr(func, "__qualname__", repr(func)))
+    try:
+        source = inspect.getsourcefile(func)
+    except TypeError:
+        source = None
+    return name + "@" + (loaders._source_state([source]) if source else "")
+
+
+def _read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_current(out_file, key):
+    """True when `out_file` exists and was last rendered with `key`."""
+    folder, name = os.path.split(os.path.abspath(out_file))
+    return os.path.exists(out_file) and _read_manifest(folder).get(name) == key
+
+
+def record(out_file, key):
+    """Remember that `out_file` now holds the render for `key`."""
+    record_all({out_file: key})
+
+
+def record_all(renders):
+    """`record` for a dict of out_file -> key, one manifest write per folder."""
+    folders = {}
+    for out_file, key in renders.items():
+        folder, name = os.path.split(os.path.abspath(out_file))
+        folders.setdefault(folder, {})[name] = key
+    for folder, keys in folders.items():
+        manifest = _read_manifest(folder)
+        manifest.update(keys)
+        # write then rename so a crash never leaves a truncated manifest
+        tmp_file = "{}.{}.tmp".format(os.path.join(folder, MANIFEST), os.getpid())
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, os.path.join(folder, MANIFEST))
+
+
+def render_if_changed(out_file, key, draw, force=False):
+    """Call `draw()` (which writes `out_file`) unless it is current for `key`.
+
+    Returns True when the chart was drawn.
+    """
+    if not force and is_current(out_file, key):
+        return False
+    draw()
+    record(out_file, key)
+    return True
+
+
+class FrameCache:
+    """Rendered animation frames as PNGs named by their content key.
+
+    Frames are grouped in one folder per `group` (the key of the settings
+    they share). Opening a group marks it used and deletes all but the
+    `keep` most recently used groups, so frames orphaned by a code or option
+    change don't pile up.
+    """
+
+    def __init__(self, group, cache_dir=None, keep=4):
+        root = cache_dir or os.path.join(loaders.CACHE_DIR, "frames")
+        self.cache_dir = os.path.join(root, group)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        os.utime(self.cache_dir)
+        groups = [os.path.join(root, name) for name in os.listdir(root)]
+        groups = sorted((g for g in groups if os.path.isdir(g)), key=os.path.getmtime, reverse=True)
+        for stale in groups[keep:]:
+            shutil.rmtree(stale, ignore_errors=True)
+        # frames from before groups existed sit directly in the root
+        for stale in glob.glob(os.path.join(root, "*.png")):
+            os.remove(stale)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def load(self, key):
+        """RGBA array of the frame for `key`, or None if it hasn't been rendered."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        from PIL import Image
+
+        with Image.open(path) as image:
+            return np.asarray(image.convert("RGBA"))
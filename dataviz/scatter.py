@@ -0,0 +1,124 @@
+"""
+Title: Grouped scatter plots
+Author: Keaton Turner
+Description: Scatter plots colored by one category and shaped by another.
+The data is split with a single groupby and each marker shape is drawn as
+one collection with per-point colors, so any number of categories works.
+Above a point threshold the points are binned per category into a 2D
+histogram and only the occupied bins are drawn, so rendering time and file
+size no longer depend on the row count.
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib.colors import to_rgba
+from matplotlib.lines import Line2D
+
+from dataviz.style import COLORS
+
+MARKERS = ["o", "^", "s", "D", "v", "P", "X", "*"]
+
+# above this many rows grouped_scatter switches to the binned density mode
+MAX_POINTS = 100000
+
+
+def category_styles(values, styles, fallback):
+    """Dict of category value -> style, `styles` may be a dict or a list in sorted order.
+
+    Missing values get no style (their rows are left out, as groupby does).
+    """
+    values = sorted(pd.Series(values).dropna().unique())
+    if isinstance(styles, dict):
+        return {v: styles.get(v, fallback[i % len(fallback)]) for i, v in enumerate(values)}
+    styles = list(styles or fallback)
+    return {v: styles[i % len(styles)] for i, v in enumerate(values)}
+
+
+def binned_counts(xs, ys, codes, n_codes, bins):
+    """Counts per (code, x bin, y bin) in one bincount pass, plus the bin centers."""
+    xmin, xmax = np.nanmin(xs), np.nanmax(xs)
+    ymin, ymax = np.nanmin(ys), np.nanmax(ys)
+    xstep = (xmax - xmin) / bins or 1.0
+    ystep = (ymax - ymin) / bins or 1.0
+    bx = np.clip(((xs - xmin) / xstep).astype(np.int64), 0, bins - 1)
+    by = np.clip(((ys - ymin) / ystep).astype(np.int64), 0, bins - 1)
+    flat = (codes * bins + bx) * bins + by
+    counts = np.bincount(flat, minlength=n_codes * bins * bins).reshape(n_codes, bins, bins)
+    xcenters = xmin + (np.arange(bins) + 0.5) * xstep
+    ycenters = ymin + (np.arange(bins) + 0.5) * ystep
+    return counts, xcenters, ycenters
+
+
+def _density_scatter(ax, df, xs, ys, color_by, marker_by, color_map, marker_map, s, alpha, bins):
+    # combine both categories into one integer code per row
+    mcodes = pd.Categorical(df[marker_by], categories=list(marker_map)).codes
+    ccodes = pd.Categorical(df[color_by], categories=list(color_map)).codes
+    # rows with a missing coordinate or category (code -1) aren't drawn
+    valid = ~(np.isnan(xs) | np.isnan(ys)) & (mcodes >= 0) & (ccodes >= 0)
+    codes = mcodes.astype(np.int64) * len(color_map) + ccodes
+    counts, xcenters, ycenters = binned_counts(xs[valid], ys[valid], codes[valid],
+                                               len(marker_map) * len(color_map), bins)
+
+    # marker size and opacity grow with the log of the bin count
+    top = np.log1p(counts.max())
+    for m, marker in enumerate(marker_map.values()):
+        layer = counts[m * len(color_map):(m + 1) * len(color_map)]
+        cidx, ix, iy = np.nonzero(layer)
+        if len(cidx) == 0:
+            continue
+        weight = np.log1p(layer[cidx, ix, iy]) / top
+        point_colors = np.asarray([to_rgba(color_map[c]) for c in color_map])[cidx]
+        point_colors = np.column_stack([point_colors[:, :3], alpha * (0.25 + 0.75 * weight)])
+        ax.scatter(xcenters[ix], ycenters[iy], c=point_colors, marker=marker, s=s * (0.2 + 0.8 * weight))
+
+    present = counts.reshape(len(marker_map), len(color_map), -1).sum(axis=2) > 0
+    return {(mv, cv) for i, mv in enumerate(marker_map) for j, cv in enumerate(color_map) if present[i, j]}
+
+
+def grouped_scatter(ax, df, x, y, color_by, marker_by, colors=None, markers=None, color_names=None,
+                    marker_names=None, scale=1.0, s=150, alpha=0.7, max_points=MAX_POINTS, bins=60):
+    """Scatter `x` vs `y` (divided by `scale`), colored by `color_by` with a marker per `marker_by`.
+
+    With more than `max_points` rows (None never switches) each category is
+    binned into a `bins` x `bins` grid and one marker is drawn per occupied
+    bin, sized and shaded by its count. Returns the legend handles, one per
+    color/marker combination present, labelled "<color name>:<marker name>".
+    """
+    color_map = category_styles(df[color_by], colors, COLORS)
+    marker_map = category_styles(df[marker_by], markers, MARKERS)
+    color_names = color_names or {}
+    marker_names = marker_names or {}
+    xs = df[x].to_numpy(dtype=float) / scale
+    ys = df[y].to_numpy(dtype=float) / scale
+
+    if max_points is not None and len(df) > max_points:
+        groups = _density_scatter(ax, df, xs, ys, color_by, marker_by, color_map, marker_map,
+                                  s, alpha, bins)
+        return _legend_handles(groups, color_map, marker_map, color_names, marker_names, s, alpha)
+
+    # one pass over the rows: row positions for every (marker, color) combination
+    groups = df.groupby([marker_by, color_by], sort=True).indices
+
+    for marker_value, marker in marker_map.items():
+        keys = [key for key in groups if key[0] == marker_value]
+        if not keys:
+            continue
+        rows = np.concatenate([groups[key] for key in keys])
+        point_colors = np.concatenate([np.tile(to_rgba(color_map[key[1]]), (len(groups[key]), 1))
+                                       for key in keys])
+        ax.scatter(xs[rows], ys[rows], c=point_colors, alpha=alpha, marker=marker, s=s)
+
+    return _legend_handles(groups, color_map, marker_map, color_names, marker_names, s, alpha)
+
+
+def _legend_handles(groups, color_map, marker_map, color_names, marker_names, s, alpha):
+    handles = []
+    for color_value, color in color_map.items():
+        for marker_value, marker in marker_map.items():
+            if (marker_value, color_value) not in groups:
+                continue
+            label = "{}:{}".format(color_names.get(color_value, color_value),
+                                   marker_names.get(marker_value, marker_value))
+            handles.append(Line2D([], [], color=color, marker=marker, linestyle="", alpha=alpha,
+                                  markersize=np.sqrt(s), label=label))
+    return handles
@@ -0,0 +1,32 @@
+"""
+Title: Shared plot styling
+Author: Keaton Turner
+Description: Colors and figure helpers shared by all the charts.
+"""
+
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+
+from dataviz.profiling import stage
+
+# define colors and defaults
+COLORS = [(174,199,232),(255,187,120),(152,223,138),(255,152,150),(197,176,213),(168,120,110)]
+COLORS = [[(i[0]/255.0),(i[1]/255.0),(i[2]/255.0)] for i in COLORS]
+
+
+def use_style():
+    """The seaborn notebook style (renamed to seaborn-v0_8-* in matplotlib 3.6)."""
+    style = "seaborn-notebook"
+    if style not in plt.style.available:
+        style = "seaborn-v0_8-notebook"
+    mpl.style.use(style)
+
+
+def finish(fig, out_file=None):
+    """Save and close `fig` when an output target is given, otherwise hand it back."""
+    if out_file is None:
+        return fig
+    with stage("savefig"):
+        fig.savefig(out_file)
+    plt.close(fig)
+    return None
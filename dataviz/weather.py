@@ -0,0 +1,116 @@
+"""
+Title: NOAA weather helpers
+Author: Keaton Turner
+Description: Loading and aggregations of the NOAA daily normals used by the
+final project plots.
+"""
+
+import numpy as np
+import pandas as pd
+
+from dataviz.counties import resolve_counties
+from dataviz.loaders import cached, read_typed_csv
+
+CUBE_METRICS = ["YTD-PRCP-NORMAL", "YTD-SNOW-NORMAL"]
+TEMPERATURES = ["DLY-TMAX-NORMAL", "DLY-TMIN-NORMAL", "DLY-TAVG-NORMAL"]
+
+# (header in the CSV, column name, dtype) of the NOAA columns the plots use,
+# anything else in the extract is skipped. Station ids and dates repeat on
+# every row so they are categorical, the normals only carry a couple of
+# decimals and fit float32. Coordinates stay float64, they key the station
+# county cache.
+WEATHER_SCHEMA = ([("STATION", "STATION", "category"),
+                   ("LATITUDE", "LATITUDE", "float64"),
+                   ("LONGITUDE", "LONGITUDE", "float64"),
+                   ("DATE", "DATE", "category")]
+                  + [(col, col, "float32") for col in CUBE_METRICS + TEMPERATURES])
+MONTHS = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
+
+
+def add_date_parts(weather_df):
+    """Add integer MONTH (1-12) and DAY columns parsed from DATE ('D-Mon').
+
+    Only the distinct DATE strings (at most 366) are parsed, then spread back
+    over the rows through the categorical codes.
+    """
+    dates = pd.Categorical(weather_df["DATE"])
+    parts = pd.Series(dates.categories).str.split("-", n=1, expand=True)
+    day = parts[0].astype("int8").to_numpy()
+    month = (pd.Categorical(parts[1], categories=MONTHS).codes + 1).astype("int8")
+    weather_df["MONTH"] = month[dates.codes]
+    weather_df["DAY"] = day[dates.codes]
+    return weather_df
+
+
+def map_categories(column, func):
+    """Categorical column with `func` applied to its distinct values only.
+
+    `func` takes and returns a Series of the categories. Values that come out
+    equal are merged and missing results become NaN rows.
+    """
+    column = column.astype("category")
+    mapped = func(pd.Series(column.cat.categories))
+    codes, categories = pd.factorize(np.asarray(mapped))
+    codes = np.append(codes, -1)  # NaN rows (code -1) stay NaN
+    return pd.Series(pd.Categorical.from_codes(codes[column.cat.codes.to_numpy()], categories=categories),
+                     index=column.index, name=column.name)
+
+
+def daily_county_cube(weather_df, map_df, metrics=CUBE_METRICS, county_col="COUNTY"):
+    """Mean of each metric per day and county as a dense (day, county, metric) array.
+
+    Only positive values are averaged (zero/missing stations don't count),
+    counties follow the row order of `map_df`, and days follow their order
+    in `weather_df`. Returns `(days, cube)` with NaN where a county has no data,
+    so a whole frame of the animation is just `cube[i]`.
+    """
+    days = np.asarray(pd.unique(weather_df["DATE"]), dtype=object)
+    counties = pd.unique(map_df[county_col])
+    day_codes = pd.Categorical(weather_df["DATE"], categories=days).codes
+    county_codes = pd.Categorical(weather_df[county_col], categories=counties).codes
+
+    # single groupby over (DATE, COUNTY) for every metric
+    values = weather_df[metrics].where(weather_df[metrics] > 0)
+    means = values.groupby([day_codes, county_codes]).mean()
+    day_idx = means.index.get_level_values(0).to_numpy()
+    county_idx = means.index.get_level_values(1).to_numpy()
+    known = county_idx >= 0  # stations in counties missing from the shapefile
+
+    cube = np.full((len(days), len(counties), len(metrics)), np.nan)
+    cube[day_idx[known], county_idx[known]] = means.to_numpy()[known]
+
+    rows = pd.Index(counties).get_indexer(map_df[county_col])
+    return days, cube[:, rows, :]
+
+
+def load_weather(weather_file, map_df, map_file, county_cache_file=None, use_geocoder=False):
+    """Read the NOAA CSV with fixed dates, MONTH/DAY columns and each station's COUNTY.
+
+    The finished frame is cached on disk against the weather and shape files
+    and the schema and code it is built with.
+    """
+    def build():
+        weather_df = read_typed_csv(weather_file, WEATHER_SCHEMA)
+        weather_df["DATE"] = map_categories(weather_df["DATE"], lambda d: d.str.replace('Feb-29','29-Feb'))
+        weather_df = add_date_parts(weather_df) # integer MONTH/DAY columns for filtering
+
+        # map weather stations to a county via lat/long (point-in-polygon against
+        # the county shapes, cached between runs, geocoder only for stations
+        # outside every county)
+        stations = resolve_counties(weather_df, map_df, cache_file=county_cache_file, use_geocoder=use_geocoder)
+        county_map = stations.drop_duplicates("STATION", keep="last").set_index("STATION")["COUNTY"]
+
+        # add county to weather data, looked up once per station and spread
+        # over the rows through the station codes
+        weather_df["COUNTY"] = map_categories(weather_df["STATION"], lambda s: county_map.reindex(s))
+        return weather_df
+
+    return cached("weather_counties", [weather_file, map_file], build,
+                  options=(use_geocoder, WEATHER_SCHEMA))
+
+
+def station_density(weather_df):
+    """Dict of station count per county."""
+    density = weather_df.groupby(["COUNTY"])["STATION"].nunique()
+    density = density.reset_index().values.tolist()
+    return {i[0]:i[1] for i in density}
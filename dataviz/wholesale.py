@@ -0,0 +1,196 @@
+"""
+Title: Wholesale customer spending charts
+Author: Keaton Turner
+Description: Boxplots, stacked bars and a scatter plot of annual customer
+spending totals (I think in Euros) for a wholesale distributor.
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from dataviz.boxstats import QuantileSketch, box_stats
+from dataviz.loaders import read_csv
+from dataviz.profiling import stage
+from dataviz.scatter import MAX_POINTS, grouped_scatter
+from dataviz.streaming import stream_group_sums
+from dataviz.style import COLORS, finish, use_style
+
+SPENDING_COLS = ["fresh","milk","grocery","frozen","detergent","delicatessen"]
+CHANNELS = {1: "HoReCa", 2: "Retail"}
+REGIONS = {1: "Lisbon", 2: "Oporto", 3: "Other"}
+
+
+def sorted_by_mean(customerdf):
+    """Box statistics of spending (in thousands) per variable, in order of
+    increasing mean value."""
+    # narrow down to only numeric variables and divide by 1000
+    numdf = customerdf[SPENDING_COLS] / 1000.0
+
+    # summarise each column once, ax.bxp draws the boxes from the stats
+    stats = [box_stats(numdf[col].to_numpy(), label=col) for col in SPENDING_COLS]
+    return sorted(stats, key=lambda x: x["mean"])
+
+
+def stream_sorted_by_mean(csv_file, chunksize=1000000, relative_accuracy=0.01):
+    """Like `sorted_by_mean`, read from `csv_file` in chunks. Quartiles and
+    whiskers come from mergeable quantile sketches, within
+    `relative_accuracy` of the exact values; fliers are sampled."""
+    sketches = {col: QuantileSketch(relative_accuracy) for col in SPENDING_COLS}
+    for chunk in pd.read_csv(csv_file, usecols=SPENDING_COLS, chunksize=chunksize):
+        for col, sketch in sketches.items():
+            sketch.add(chunk[col].to_numpy(dtype=float) / 1000.0)
+    stats = [sketch.box_stats(label=col) for col, sketch in sketches.items()]
+    return sorted(stats, key=lambda x: x["mean"])
+
+
+def group_totals(customerdf, by):
+    """Spending totals (in 100k) per variable for each `by` group, one row per group."""
+    return customerdf.groupby(by)[SPENDING_COLS].aggregate("sum") / 100000
+
+
+def stream_group_totals(csv_file, by=("channel", "region"), chunksize=1000000):
+    """Like `group_totals` for every column in `by`, read from `csv_file` in
+    chunks so the whole extract never has to fit in memory."""
+    sums = stream_group_sums(csv_file, list(by), SPENDING_COLS, chunksize=chunksize)
+    return {col: acc.totals() / 100000 for col, acc in sums.items()}
+
+
+def spending_boxplots(customerdf, out_file=None):
+    """Boxplots for all spending variables, sorted by increasing mean value."""
+    return draw_boxplots(sorted_by_mean(customerdf), out_file)
+
+
+def draw_boxplots(items_sorted_by_mean, out_file=None):
+    """Boxplots of the output of `sorted_by_mean` or `stream_sorted_by_mean`."""
+    # generate the figure
+    fig, ax = plt.subplots(figsize = (12,10))
+    bplot = ax.bxp(items_sorted_by_mean, patch_artist=True)
+    for patch, color in zip(bplot['boxes'], COLORS):
+        patch.set_facecolor(color)
+    ax.set_xticklabels([i["label"] for i in items_sorted_by_mean], fontsize = 20, rotation=45)
+    ax.spines['right'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+    ax.tick_params(axis='y', labelsize = 20)
+    ax.set_title("Annual Wholesale Spending",fontsize = 25)
+    ax.set_ylabel("Euros (in thousands)", fontsize = 20)
+    return finish(fig, out_file)
+
+
+def draw_stacked_bars(totals, names, colors, title, out_file=None, reverse=False):
+    """Horizontal bars per variable with one stacked segment per group (row of
+    `totals`); `names`/`colors` map group keys to legend labels and colors."""
+    values = totals.to_numpy()
+    # each group starts where the groups before it end
+    lefts = np.vstack([np.zeros(values.shape[1]), np.cumsum(values, axis=0)[:-1]])
+
+    fig, ax = plt.subplots(figsize = (15,10))
+    for i, group in enumerate(totals.index):
+        ax.barh(list(totals.columns), values[i], left=lefts[i],
+                color=colors.get(group, COLORS[i % len(COLORS)]), label = names.get(group, group))
+    ax.spines['right'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+    ax.spines['left'].set_visible(False)
+    ax.tick_params(axis='x', labelsize=20)
+    ax.tick_params(
+        axis='y',
+        which='both',
+        left=False,
+        top=False,
+        labelleft=False)
+    ax.set_title(title, fontsize = 30)
+    ax.legend(fontsize = 20, bbox_to_anchor=(0.6,0.8))
+    if reverse:
+        ax.invert_xaxis() # reverse the plot
+    return finish(fig, out_file)
+
+
+def spending_per_channel(customerdf, out_file=None):
+    """Stacked bars for each variable, colored by retail channel."""
+    return draw_channel_bars(group_totals(customerdf, "channel"), out_file)
+
+
+def draw_channel_bars(channel_counts, out_file=None):
+    """Stacked bars of the `group_totals` per channel."""
+    return draw_stacked_bars(channel_counts, CHANNELS, {1: COLORS[3], 2: COLORS[4]},
+                             "Total Spending Per Channel", out_file)
+
+
+def spending_per_region(customerdf, out_file=None):
+    """Stacked bars for each variable, colored by customer region."""
+    return draw_region_bars(group_totals(customerdf, "region"), out_file)
+
+
+def draw_region_bars(region_counts, out_file=None):
+    """Stacked bars of the `group_totals` per region."""
+    return draw_stacked_bars(region_counts, REGIONS, {1: COLORS[0], 2: COLORS[1], 3: COLORS[2]},
+                             "Total Spending Per Region", out_file, reverse=True)
+
+
+def fresh_vs_grocery(customerdf, out_file=None, max_points=MAX_POINTS):
+    """Fresh vs grocery spending, colored by channel with a marker per region.
+
+    Above `max_points` customers the points are binned into a density view.
+    """
+    fig, ax = plt.subplots(figsize = (15,10))
+    handles = grouped_scatter(ax, customerdf, "fresh", "grocery", "channel", "region",
+                              colors={1: COLORS[3], 2: COLORS[4]}, markers={1: "o", 2: "^", 3: "s"},
+                              color_names=CHANNELS, marker_names=REGIONS, scale=1000,
+                              max_points=max_points)
+
+    ax.spines['right'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+    ax.tick_params(labelsize=20)
+    ax.set_xlabel("fresh", fontsize=25)
+    ax.set_ylabel("grocery", fontsize=25)
+    ax.set_title("Spending Trends: Grocery vs Fresh", fontsize = 30)
+    ax.legend(handles=handles, fontsize = 20, bbox_to_anchor=(0.6,0.8))
+    with stage("tight_layout"):
+        fig.tight_layout()
+    return finish(fig, out_file)
+
+
+def load(config):
+    """Inputs for the CLI: `customers` is the spending CSV, optional
+    `scatter_max_points` sets when the scatter switches to binned density and
+    `chunksize` streams the CSV for the boxplots and the stacked bar totals
+    (the boxplots then use approximate quantiles). The full frame is only
+    read when a chart needs it."""
+    use_style()
+    return {"config": config, "max_points": config.get("scatter_max_points", MAX_POINTS)}
+
+
+def _customers(data):
+    if "customerdf" not in data:
+        data["customerdf"] = read_csv(data["config"]["customers"])
+    return data["customerdf"]
+
+
+def _totals(data, by):
+    config = data["config"]
+    if "chunksize" not in config:
+        return group_totals(_customers(data), by)
+    if "totals" not in data:
+        data["totals"] = stream_group_totals(config["customers"], chunksize=config["chunksize"])
+    return data["totals"][by]
+
+
+def _box_stats(data):
+    config = data["config"]
+    if "chunksize" not in config:
+        return sorted_by_mean(_customers(data))
+    return stream_sorted_by_mean(config["customers"], chunksize=config["chunksize"])
+
+
+CHARTS = {
+    "wholesale_boxplots": ("wholesale_spending_boxplots.png",
+                           lambda data: (_box_stats(data),), draw_boxplots),
+    "spending_per_channel": ("spending_per_channel.png",
+                             lambda data: (_totals(data, "channel"),), draw_channel_bars),
+    "spending_per_region": ("spending_per_region.png",
+                            lambda data: (_totals(data, "region"),), draw_region_bars),
+    "fresh_vs_grocery": ("fresh-vs-grocery.png",
+                         lambda data: (_customers(data)[["fresh", "grocery", "channel", "region"]],
+                                       data["max_points"]),
+                         lambda df, max_points, out_file: fresh_vs_grocery(df, out_file, max_points)),
+}